@@ -10,7 +10,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..core.security import verify_access_token, generate_correlation_id
-from ..core.logging import get_logger
+from ..core.logging import correlation_id_var, get_logger
 from ..core.errors import (
     create_auth_required_error,
     create_token_expired_error,
@@ -127,7 +127,8 @@ async def get_correlation_id(
     if hasattr(request.state, "correlation_id"):
         return request.state.correlation_id
     
-    correlation_id = generate_correlation_id()
+    # Reuse the ID the correlation middleware already put in context
+    correlation_id = correlation_id_var.get() or generate_correlation_id()
     request.state.correlation_id = correlation_id
     return correlation_id
 
@@ -144,6 +145,7 @@ async def verify_webhook_signature(
     """
     from ..core.security import (
         verify_webhook_signature_hmac,
+        verify_webhook_signature_blake2b,
         verify_webhook_signature_jwt,
         verify_webhook_timestamp,
         WebhookVerificationError
@@ -182,6 +184,18 @@ async def verify_webhook_signature(
                 )
             signature_data = {"type": x_signature_type, "verified": True}
             
+        elif x_signature_type == "blake2b":
+            if not verify_webhook_signature_blake2b(body, x_signature, settings.webhook_secret):
+                logger.warning("BLAKE2b signature verification failed", extra={
+                    "signature_type": x_signature_type,
+                    "correlation_id": getattr(request.state, "correlation_id", None)
+                })
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid webhook signature"
+                )
+            signature_data = {"type": x_signature_type, "verified": True}
+            
         elif x_signature_type == "jwt":
             payload = verify_webhook_signature_jwt(x_signature, settings.webhook_secret)
             signature_data = {"type": "jwt", "verified": True, "payload": payload}
@@ -267,7 +281,7 @@ async def check_auth_login_rate_limit(
         client_id = get_client_identifier(request)
         rate_limiter_service.check_auth_login_rate_limit(client_id, correlation_id)
     except RateLimitExceeded as e:
-        raise create_rate_limit_exception(e.retry_after, correlation_id, "login")
+        raise create_rate_limit_exception(e.retry_after, correlation_id, "login", e.headers)
 
 
 async def check_auth_callback_rate_limit(
@@ -279,7 +293,7 @@ async def check_auth_callback_rate_limit(
         client_id = get_client_identifier(request)
         rate_limiter_service.check_auth_callback_rate_limit(client_id, correlation_id)
     except RateLimitExceeded as e:
-        raise create_rate_limit_exception(e.retry_after, correlation_id, "callback")
+        raise create_rate_limit_exception(e.retry_after, correlation_id, "callback", e.headers)
 
 
 async def check_token_refresh_rate_limit(
@@ -292,7 +306,7 @@ async def check_token_refresh_rate_limit(
         user_id = str(current_user.id)
         rate_limiter_service.check_token_refresh_rate_limit(user_id, correlation_id)
     except RateLimitExceeded as e:
-        raise create_rate_limit_exception(e.retry_after, correlation_id, "refresh")
+        raise create_rate_limit_exception(e.retry_after, correlation_id, "refresh", e.headers)
 
 
 async def check_auth_general_rate_limit(
@@ -309,7 +323,7 @@ async def check_auth_general_rate_limit(
         
         rate_limiter_service.check_auth_general_rate_limit(user_id, correlation_id)
     except RateLimitExceeded as e:
-        raise create_rate_limit_exception(e.retry_after, correlation_id, "general")
+        raise create_rate_limit_exception(e.retry_after, correlation_id, "general", e.headers)
 
 
 AuthLoginRateLimit = Annotated[None, Depends(check_auth_login_rate_limit)]
@@ -131,11 +131,12 @@ async def oauth_callback(
         
         redirect_uri = f"{request.base_url}auth/callback"
         
-        logger.info("Processing OAuth callback", extra={
-            "correlation_id": correlation_id,
-            "code": code[:8] + "...",
-            "state": state[:8] + "..."
-        })
+        logger.info(
+            "Processing OAuth callback",
+            correlation_id=correlation_id,
+            oauth_code=code,
+            oauth_state=state
+        )
         
         token_response = await auth_service.handle_oauth_callback(
             code=code,
@@ -153,7 +154,7 @@ async def oauth_callback(
             httponly=True,           
             secure=not settings.debug,  
             samesite="strict", 
-            max_age=settings.access_token_expire_minutes * 60,
+            max_age=token_response.expires_in,
             path="/"
         )
         
@@ -218,7 +219,7 @@ async def refresh_token(
             httponly=True,         
             secure=not settings.debug,  
             samesite="strict",     
-            max_age=settings.access_token_expire_minutes * 60,
+            max_age=token_response.expires_in,
             path="/"
         )
         
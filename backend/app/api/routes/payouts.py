@@ -2,10 +2,11 @@
 Payout routes for CRUD operations with pagination, authentication, and rate limiting.
 """
 
+from datetime import datetime
 from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status, Header, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..deps import (
@@ -36,17 +37,23 @@ logger = get_logger(__name__)
 router = APIRouter(prefix="/payouts", tags=["payouts"])
 
 
-@router.post("/", response_model=PayoutRead, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=PayoutRead, status_code=status.HTTP_202_ACCEPTED)
 async def create_payout(
     payout_data: PayoutCreate,
     current_user: CurrentUser,
     correlation_id: CorrelationID,
+    background_tasks: BackgroundTasks,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     idempotency_key: str = Header(..., alias="Idempotency-Key")
 ) -> PayoutRead:
     """
     Create a new payout with idempotency, rate limiting, and retry logic.
     
+    Responds 202 Accepted with the stored payout, whose status is pending (a replayed
+    Idempotency-Key returns the payout as it stands). The provider call runs after the
+    response is sent; its result arrives later by webhook, and clients see it by
+    polling GET /payouts/.
     """
     try:
         logger.info("Creating payout", extra={
@@ -63,8 +70,10 @@ async def create_payout(
             payout_data=payout_data,
             user=current_user,
             idempotency_key=idempotency_key,
-            correlation_id=correlation_id
+            correlation_id=correlation_id,
+            background_tasks=background_tasks
         )
+        response.headers.update(payout_service.rate_limit_headers)
         
         logger.info("Payout created successfully", extra={
             "correlation_id": correlation_id,
@@ -98,12 +107,26 @@ async def list_payouts(
     correlation_id: CorrelationID,
     db: AsyncSession = Depends(get_db),
     page: int = Query(1, ge=1, description="Page number (1-based)"),
-    page_size: int = Query(20, ge=1, le=100, description="Number of items per page")
+    page_size: int = Query(20, ge=1, le=100, description="Number of items per page"),
+    created_before: Optional[datetime] = Query(
+        None, description="Keyset cursor: created_at of the last payout on the previous page"
+    ),
+    before_id: Optional[UUID] = Query(
+        None, description="Keyset cursor: id of the last payout on the previous page"
+    )
 ) -> PayoutList:
     """
     Get paginated list of payouts for the authenticated user.
 
+    With a keyset cursor (created_before and before_id together), page is ignored
+    and returned as null.
     """
+    if (created_before is None) != (before_id is None):
+        raise create_validation_error(
+            message="created_before and before_id must be given together",
+            correlation_id=correlation_id
+        )
+    
     try:
         logger.info("Listing payouts", extra={
             "correlation_id": correlation_id,
@@ -118,7 +141,9 @@ async def list_payouts(
             user=current_user,
             page=page,
             page_size=page_size,
-            correlation_id=correlation_id
+            correlation_id=correlation_id,
+            created_before=created_before,
+            before_id=before_id
         )
         
         logger.info("Payouts listed successfully", extra={
@@ -83,10 +83,10 @@ async def receive_payment_webhook(
             "event_id": webhook_data.event_id if webhook_data else None
         })
         
-        return WebhookResponse(
-            success=False,
-            message="Webhook processing failed",
-            correlation_id=correlation_id
+        # Answer 5xx so the provider redelivers; the event was not applied
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Webhook processing failed"
         )
 
 
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
 
@@ -8,6 +10,12 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     
     database_url: str
+    db_prepared_statement_cache_size: int = 500
+    db_statement_cache_size: int = 1024
+    db_pool_size: int = 20
+    db_max_overflow: int = 40
+    db_pool_timeout_seconds: int = 5
+    db_pool_recycle_seconds: int = 1800
     
     secret_key: str
     access_token_expire_minutes: int = 30
@@ -18,8 +26,13 @@ class Settings(BaseSettings):
     
     webhook_secret: str
     webhook_timeout_seconds: int = 300  
+    webhook_batch_window_ms: int = 50
+    # hmac_sha256 or blake2b; signature type the webhook callback service signs with
+    webhook_signature_type: str = "hmac_sha256"
     
     rate_limit_per_minute: int = 10
+    # Shares payout rate limits across workers when set; otherwise limits are per process
+    redis_url: Optional[str] = None
     
     auth_login_rate_limit: int = 20  #
     auth_login_window_minutes: int = 15
@@ -56,6 +69,13 @@ class Settings(BaseSettings):
     )
 
     
+    @field_validator("webhook_signature_type")
+    @classmethod
+    def validate_webhook_signature_type(cls, v: str) -> str:
+        if v not in ("hmac_sha256", "blake2b"):
+            raise ValueError("webhook_signature_type must be hmac_sha256 or blake2b")
+        return v
+    
     @field_validator("database_url")
     @classmethod
     def validate_db_url(cls, v: str) -> str:
@@ -179,7 +179,8 @@ def create_validation_error(
 def create_rate_limit_error(
     retry_after: int,
     limit_type: str = "requests",
-    correlation_id: Optional[str] = None
+    correlation_id: Optional[str] = None,
+    rate_limit_headers: Optional[Dict[str, str]] = None
 ) -> HTTPException:
     """Create rate limit exceeded error."""
     return create_error_response(
@@ -189,6 +190,7 @@ def create_rate_limit_error(
         correlation_id=correlation_id,
         retry_after=retry_after,
         headers={
+            **(rate_limit_headers or {}),
             "Retry-After": str(retry_after),
             "X-RateLimit-Type": limit_type
         }
@@ -6,8 +6,18 @@ from contextvars import ContextVar
 from typing import Optional
 from .config import settings
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
 correlation_id_var: ContextVar[Optional[str]] = ContextVar('correlation_id', default=None)
 
+# OAuth secrets that are only ever logged as a short prefix, whether passed as
+# keyword arguments or inside extra={...}
+TRUNCATED_LOG_KEYS = frozenset({"oauth_state", "oauth_nonce", "oauth_code", "id_token_nonce"})
+TRUNCATED_LOG_PREFIX_LENGTH = 8
+
 def configure_logging() -> None:
     """Configure structured logging with correlation ID support"""
     
@@ -25,16 +35,30 @@ def configure_logging() -> None:
         logger_obj.propagate = True
         logger_obj.setLevel(level)
     
+    if settings.debug:
+        renderer = structlog.dev.ConsoleRenderer()
+        logger_factory = structlog.PrintLoggerFactory()
+    elif orjson is not None:
+        # orjson renders straight to bytes, so write them without a decode/encode round-trip.
+        # It serializes UUIDs and datetimes natively, so log fields need no str() at call sites.
+        renderer = structlog.processors.JSONRenderer(serializer=orjson.dumps, option=orjson.OPT_UTC_Z)
+        logger_factory = structlog.BytesLoggerFactory()
+    else:
+        # Match orjson's output for UUIDs and other values json can't encode
+        renderer = structlog.processors.JSONRenderer(default=str)
+        logger_factory = structlog.PrintLoggerFactory()
+    
     structlog.configure(
         processors=[
             structlog.contextvars.merge_contextvars,
             structlog.processors.add_log_level,
             structlog.processors.TimeStamper(fmt="iso"),
             add_correlation_id,
-            structlog.dev.ConsoleRenderer() if settings.debug else structlog.processors.JSONRenderer()
+            truncate_sensitive_values,
+            renderer
         ],
         wrapper_class=structlog.make_filtering_bound_logger(level),
-        logger_factory=structlog.PrintLoggerFactory(),
+        logger_factory=logger_factory,
         cache_logger_on_first_use=True,
     )
 
@@ -45,6 +69,24 @@ def add_correlation_id(logger, method_name, event_dict):
         event_dict["correlation_id"] = correlation_id
     return event_dict
 
+def _truncate_keys(values: dict) -> None:
+    """Shorten the OAuth secrets found among one level of log fields"""
+    for key in TRUNCATED_LOG_KEYS.intersection(values):
+        value = values[key]
+        if isinstance(value, str):
+            values[key] = value[:TRUNCATED_LOG_PREFIX_LENGTH] + "..."
+
+def truncate_sensitive_values(logger, method_name, event_dict):
+    """Shorten OAuth secrets to a prefix, only for entries that are actually emitted"""
+    _truncate_keys(event_dict)
+    extra = event_dict.get("extra")
+    if isinstance(extra, dict):
+        # Copied so the caller's dict is left untouched
+        extra = dict(extra)
+        _truncate_keys(extra)
+        event_dict["extra"] = extra
+    return event_dict
+
 def get_correlation_id() -> str:
     """Get current correlation ID or generate new one"""
     correlation_id = correlation_id_var.get()
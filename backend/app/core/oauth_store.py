@@ -47,6 +47,17 @@ class OAuthSessionStore:
             
             return session_data
     
+    def pop_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve and remove OAuth session data in one step, so a state can only be used once."""
+        with self._lock:
+            self._cleanup_expired()
+            
+            session_data = self._store.pop(session_id, None)
+            if session_data is None or datetime.utcnow() > session_data["expires_at"]:
+                return None
+            
+            return session_data
+    
     def delete_session(self, session_id: str) -> bool:
         """Delete OAuth session data."""
         with self._lock:
@@ -22,9 +22,9 @@ import base64
 
 from .config import settings
 from .errors import create_external_service_error
-import logging
+from .logging import get_logger
 
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -315,6 +315,42 @@ def verify_webhook_signature_hmac(
         return False
 
 
+def webhook_blake2b_key(secret: str) -> bytes:
+    """
+    Derive the BLAKE2b MAC key for a webhook secret.
+    Secrets longer than BLAKE2b's 64-byte key limit are hashed down first, as HMAC does.
+    """
+    key = secret.encode()
+    if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+        key = hashlib.blake2b(key).digest()
+    return key
+
+
+def sign_webhook_payload_blake2b(payload: bytes, key: bytes) -> str:
+    """Return the ``blake2b=<hex>`` signature of a payload under a derived key."""
+    return f"blake2b={hashlib.blake2b(payload, key=key, digest_size=32).hexdigest()}"
+
+
+def verify_webhook_signature_blake2b(
+    payload: bytes,
+    signature: str,
+    secret: str
+) -> bool:
+    """
+    Verify webhook signature using keyed BLAKE2b.
+    A single keyed hash pass replaces the two passes of HMAC.
+    """
+    try:
+        expected_signature = sign_webhook_payload_blake2b(payload, webhook_blake2b_key(secret))
+        if "=" not in signature:
+            expected_signature = expected_signature.split("=", 1)[1]
+        return hmac.compare_digest(signature, expected_signature)
+        
+    except Exception as e:
+        logger.warning("BLAKE2b signature verification failed", extra={"error": str(e)})
+        return False
+
+
 def verify_webhook_signature_jwt(
     token: str, 
     secret: str,
@@ -429,8 +465,8 @@ def validate_id_token_nonce(id_token: str, expected_nonce: str) -> Dict[str, Any
         # Validate nonce matches expected value
         if id_token_nonce != expected_nonce:
             logger.warning("Nonce mismatch in ID token", extra={
-                "expected_nonce": expected_nonce[:8] + "...",
-                "id_token_nonce": id_token_nonce[:8] + "..."
+                "oauth_nonce": expected_nonce,
+                "id_token_nonce": id_token_nonce
             })
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -438,7 +474,7 @@ def validate_id_token_nonce(id_token: str, expected_nonce: str) -> Dict[str, Any
             )
         
         logger.info("ID token nonce validation successful", extra={
-            "nonce": expected_nonce[:8] + "..."
+            "oauth_nonce": expected_nonce
         })
         
         return unverified_payload
@@ -453,18 +489,20 @@ def validate_id_token_nonce(id_token: str, expected_nonce: str) -> Dict[str, Any
         )
 
 
+SENSITIVE_LOG_KEYS = frozenset({
+    'password', 'secret', 'token', 'key', 'authorization',
+    'client_secret', 'access_token', 'refresh_token'
+})
+
+
 def sanitize_log_data(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Remove sensitive data from logs.
     """
-    sensitive_keys = {
-        'password', 'secret', 'token', 'key', 'authorization',
-        'client_secret', 'access_token', 'refresh_token'
-    }
-    
     sanitized = {}
     for key, value in data.items():
-        if any(sensitive in key.lower() for sensitive in sensitive_keys):
+        lowered = key.lower()
+        if any(sensitive in lowered for sensitive in SENSITIVE_LOG_KEYS):
             sanitized[key] = "[REDACTED]"
         elif isinstance(value, dict):
             sanitized[key] = sanitize_log_data(value)
@@ -0,0 +1,56 @@
+"""add payout listing indexes and unique provider reference
+
+Revision ID: 20261015_000004
+Revises: 20250910_000003
+Create Date: 2026-10-15 00:00:04
+
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261015_000004"
+down_revision = "20250910_000003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Built concurrently so payouts stays writable during the deploy
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_payouts_user_id_created_at",
+            "payouts",
+            ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+        # The old index keeps serving provider_reference lookups until the unique one is built
+        op.create_index(
+            "ix_payouts_provider_reference_unique",
+            "payouts",
+            ["provider_reference"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.drop_index("ix_payouts_provider_reference", table_name="payouts", postgresql_concurrently=True)
+        op.execute("ALTER INDEX ix_payouts_provider_reference_unique RENAME TO ix_payouts_provider_reference")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_payouts_provider_reference_plain",
+            "payouts",
+            ["provider_reference"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index("ix_payouts_provider_reference", table_name="payouts", postgresql_concurrently=True)
+        op.execute("ALTER INDEX ix_payouts_provider_reference_plain RENAME TO ix_payouts_provider_reference")
+
+        op.drop_index("ix_payouts_user_id_created_at", table_name="payouts", postgresql_concurrently=True)
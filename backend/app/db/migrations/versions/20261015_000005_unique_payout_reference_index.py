@@ -0,0 +1,46 @@
+"""make the payout reference index unique and drop the duplicate constraint
+
+Revision ID: 20261015_000005
+Revises: 20261015_000004
+Create Date: 2026-10-15 00:00:05
+
+"""
+from __future__ import annotations
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "20261015_000005"
+down_revision = "20261015_000004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # uq_payouts_reference keeps serving reference lookups while the index is rebuilt
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_payouts_reference", table_name="payouts", postgresql_concurrently=True)
+        op.create_index(
+            "ix_payouts_reference",
+            "payouts",
+            ["reference"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+    op.drop_constraint("uq_payouts_reference", "payouts", type_="unique")
+
+
+def downgrade() -> None:
+    op.create_unique_constraint("uq_payouts_reference", "payouts", ["reference"])
+
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_payouts_reference", table_name="payouts", postgresql_concurrently=True)
+        op.create_index(
+            "ix_payouts_reference",
+            "payouts",
+            ["reference"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
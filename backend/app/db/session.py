@@ -1,4 +1,6 @@
-from typing import AsyncGenerator
+import asyncio
+from typing import Any, AsyncGenerator, Dict
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 from ..core.config import settings
@@ -9,9 +11,45 @@ if settings.database_url.startswith("postgresql://"):
 else:
     database_url = settings.database_url
 
-engine = create_async_engine(database_url, pool_pre_ping=True, pool_recycle=300)
+def build_engine_options(database_url: str) -> Dict[str, Any]:
+    """Engine keyword arguments for a database URL; pool sizing only applies to PostgreSQL."""
+    options: Dict[str, Any] = {"pool_pre_ping": True, "pool_recycle": settings.db_pool_recycle_seconds}
+    if database_url.startswith("postgresql+asyncpg://"):
+        # Size the pool for concurrent requests so sessions do not queue behind each other
+        options["pool_size"] = settings.db_pool_size
+        options["max_overflow"] = settings.db_max_overflow
+        # Fail fast when the pool is exhausted instead of stalling the request
+        options["pool_timeout"] = settings.db_pool_timeout_seconds
+        # Keep hot lookups as server-side prepared statements on each connection;
+        # JIT only adds planning latency to the short OLTP queries this service runs
+        options["connect_args"] = {
+            "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+            "server_settings": {"jit": "off"}
+        }
+    return options
+
+engine_options = build_engine_options(database_url)
+engine = create_async_engine(database_url, **engine_options)
 SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
 
+async def warm_up_pool() -> None:
+    """Open the pool's connections at startup so the first requests skip the connect handshake."""
+    if "pool_size" not in engine_options:
+        return
+    results = await asyncio.gather(
+        *(engine.connect() for _ in range(settings.db_pool_size)), return_exceptions=True
+    )
+    connections = [result for result in results if not isinstance(result, BaseException)]
+    try:
+        # Completes TLS and authentication before the connections go back to the pool
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in connections))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in connections))
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+
 class Base(DeclarativeBase):
     pass
 
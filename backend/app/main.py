@@ -5,8 +5,9 @@ import uuid
 from contextlib import asynccontextmanager
 from .core.config import settings
 from .core.logging import configure_logging, logger, set_correlation_id, get_correlation_id
-from .db.session import engine, Base
+from .db.session import engine, Base, warm_up_pool
 from .api.routes import auth, payouts, webhooks
+from .services.mock_payment_provider import mock_payment_provider
 from .services.webhook_callback_service import webhook_callback_service
 
 @asynccontextmanager
@@ -15,6 +16,12 @@ async def lifespan(app: FastAPI):
     configure_logging()
     logger.info("Starting Fintech Payouts API")
     
+    try:
+        await warm_up_pool()
+    except Exception as e:
+        # Not fatal: connections are still opened on demand
+        logger.warning("Database pool warm-up failed", error=str(e))
+    
     # Register webhook callback with mock payment provider
     webhook_callback_service.register_webhook_callback()
     logger.info("Webhook callback registered with mock payment provider")
@@ -23,6 +30,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Fintech Payouts API")
+    await mock_payment_provider.stop_webhook_scheduler()
 
 app = FastAPI(
     title=settings.app_name,
@@ -93,3 +101,15 @@ async def health_check():
     logger.info("health_check_requested")
     return {"status": "healthy", "correlation_id": get_correlation_id()}
 
+
+if settings.debug:
+    @app.get("/debug/pool", include_in_schema=False)
+    async def pool_status():
+        """Database connection pool usage, for checking pool sizing under load (debug only)"""
+        pool = engine.pool
+        stats = {"pool_class": type(pool).__name__, "status": pool.status()}
+        # Queue pools expose live counters; other pool classes only report status()
+        for counter in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, counter):
+                stats[counter] = getattr(pool, counter)()
+        return stats
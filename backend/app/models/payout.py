@@ -47,7 +47,7 @@ class Payout(Base):
         default=PayoutStatus.pending,
     )
 
-    provider_reference = Column(String(128), nullable=True, index=True)
+    provider_reference = Column(String(128), nullable=True, unique=True, index=True)
     provider_status = Column(String(64), nullable=True)
 
     idempotency_key = Column(String(128), nullable=False, unique=True)
@@ -71,12 +71,15 @@ class Payout(Base):
     
     user = relationship("User", back_populates="payouts", lazy="select")
 
+    # Fetch server-generated created_at/updated_at/retry_count via RETURNING on flush
+    __mapper_args__ = {"eager_defaults": True}
+
     __table_args__ = (
         CheckConstraint("char_length(currency) = 3", name="ck_payouts_currency_len_3"),
         CheckConstraint("currency = upper(currency)", name="ck_payouts_currency_upper"),
-        UniqueConstraint("reference", name="uq_payouts_reference"),
         UniqueConstraint("idempotency_key", name="uq_payouts_idempotency_key"),
         Index("ix_payouts_status_created_at", "status", "created_at"),
+        Index("ix_payouts_user_id_created_at", "user_id", created_at.desc(), id.desc()),
     )
 
 
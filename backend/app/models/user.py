@@ -23,3 +23,6 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
     
     payouts = relationship("Payout", back_populates="user", cascade="all, delete-orphan", lazy="select")
+
+    # Fetch server-generated created_at via RETURNING on flush
+    __mapper_args__ = {"eager_defaults": True}
@@ -71,7 +71,8 @@ class PayoutList(BaseModel):
     model_config = ConfigDict(strict=True)
 
     items: list[PayoutRead]
-    page: int
+    # None for keyset (cursor) pages, which have no page number
+    page: Optional[int] = None
     page_size: int
     total: int
 
@@ -9,6 +9,8 @@ from uuid import UUID
 
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 
+from ..models.payout import PayoutStatus
+
 
 class WebhookEventType(str, Enum):
     """Supported webhook event types."""
@@ -27,6 +29,7 @@ class WebhookSignatureType(str, Enum):
     
     HMAC_SHA256 = "hmac_sha256"
     HMAC_SHA1 = "hmac_sha1"
+    BLAKE2B = "blake2b"
     JWT = "jwt"
 
 
@@ -47,7 +50,7 @@ class WebhookRequest(BaseModel):
     
     payment_id: str = Field(..., description="Payment provider ID")
     reference: str = Field(..., description="Payment reference")
-    status: str = Field(..., description="Payment status")
+    status: str = Field(..., description="Payment status, as sent by the provider")
     
     amount: Optional[float] = Field(None, description="Payment amount")
     currency: Optional[str] = Field(None, description="Payment currency")
@@ -62,6 +65,14 @@ class WebhookRequest(BaseModel):
         if v is not None and len(v) != 3:
             raise ValueError("Currency must be 3 characters")
         return v.upper() if v else v
+    
+    @property
+    def payout_status(self) -> Optional[PayoutStatus]:
+        """The payout status this provider status maps to (case-insensitive), or None if unknown."""
+        try:
+            return PayoutStatus(self.status.lower())
+        except ValueError:
+            return None
 
 
 class WebhookResponse(BaseModel):
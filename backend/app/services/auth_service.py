@@ -5,10 +5,11 @@ Authentication service for OAuth 2.0 flows and user management.
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from uuid import UUID
-from urllib.parse import urlencode
+from urllib.parse import quote, urlencode
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from fastapi import HTTPException, status
 
 from ..core.security import (
@@ -20,19 +21,40 @@ from ..core.security import (
     validate_oauth_state,
     validate_id_token_nonce,
     generate_code_verifier,
-    generate_code_challenge,
-    generate_correlation_id
+    generate_code_challenge
 )
 
 OAUTH_SCOPES = ["openid", "email", "profile"]
 from ..core.oauth_store import oauth_store
 from ..core.config import settings
-from ..core.logging import get_logger
+from ..core.logging import get_correlation_id, get_logger
 from ..models.user import User
 from ..schemas.auth import GoogleUserInfo, TokenResponse, UserResponse
 
 logger = get_logger(__name__)
 
+# Built once so every lookup reuses the same compiled SQL and prepared statement
+USER_BY_ID_STMT = select(User).where(User.id == bindparam("id"))
+USER_BY_GOOGLE_ID_STMT = select(User).where(User.google_id == bindparam("google_id"))
+USER_BY_EMAIL_STMT = select(User).where(User.email == bindparam("email"))
+
+ACCESS_TOKEN_TTL_SECONDS = settings.access_token_expire_minutes * 60
+
+GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
+
+# Query parameters that are the same for every login, encoded once at import
+STATIC_OAUTH_QUERY = urlencode({
+    "client_id": settings.google_client_id,
+    "response_type": "code",
+    "scope": " ".join(OAUTH_SCOPES),
+    "code_challenge_method": "S256",
+    "access_type": "offline",
+    "prompt": "consent"
+})
+
+# SQLite (tests) has no ON CONFLICT ... RETURNING support through this dialect, so it keeps the SELECT path
+USE_UPSERT = settings.database_url.startswith("postgresql")
+
 
 class AuthService:
     """Service for handling authentication operations."""
@@ -45,7 +67,7 @@ class AuthService:
         Initiate OAuth login flow with secure state and PKCE.
         Returns authorization URL and security parameters.
         """
-        correlation_id = generate_correlation_id()
+        correlation_id = get_correlation_id()
         try:
             state = generate_oauth_state()
             nonce = generate_oauth_nonce()
@@ -62,27 +84,20 @@ class AuthService:
             }
             oauth_store.store_session(state, session_data, expires_in_seconds=600)
             
-            auth_params = {
-                "client_id": settings.google_client_id,
-                "response_type": "code",
-                "scope": " ".join(OAUTH_SCOPES),
-                "redirect_uri": redirect_uri,
-                "state": state,
-                "nonce": nonce,
-                "code_challenge": code_challenge,
-                "code_challenge_method": "S256",
-                "access_type": "offline",
-                "prompt": "consent"
-            }
-            
-            auth_url = f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(auth_params)}"
+            # state, nonce and code_challenge only use query-safe characters, so only redirect_uri needs quoting
+            auth_url = (
+                f"{GOOGLE_AUTH_URL}?{STATIC_OAUTH_QUERY}"
+                f"&redirect_uri={quote(redirect_uri, safe='')}"
+                f"&state={state}&nonce={nonce}&code_challenge={code_challenge}"
+            )
             
-            logger.info("OAuth login initiated", extra={
-                "correlation_id": correlation_id,
-                "redirect_uri": redirect_uri,
-                "state": state[:8] + "...",
-                "nonce": nonce[:8] + "..."
-            })
+            logger.info(
+                "OAuth login initiated",
+                correlation_id=correlation_id,
+                redirect_uri=redirect_uri,
+                oauth_state=state,
+                oauth_nonce=nonce
+            )
             
             return {
                 "authorization_url": auth_url,
@@ -109,24 +124,26 @@ class AuthService:
         Handle OAuth callback and exchange code for tokens.
         Creates or updates user and returns access token.
         """
-        correlation_id = generate_correlation_id()
+        correlation_id = get_correlation_id()
         try:
-            session_data = oauth_store.get_session(state)
+            session_data = oauth_store.pop_session(state)
             if not session_data:
-                logger.warning("OAuth session not found or expired", extra={
-                    "correlation_id": correlation_id,
-                    "state": state[:8] + "..."
-                })
+                logger.warning(
+                    "OAuth session not found or expired",
+                    correlation_id=correlation_id,
+                    oauth_state=state
+                )
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid or expired state parameter"
                 )
             
             if not validate_oauth_state(state):
-                logger.warning("Invalid OAuth state", extra={
-                    "correlation_id": correlation_id,
-                    "state": state[:8] + "..."
-                })
+                logger.warning(
+                    "Invalid OAuth state",
+                    correlation_id=correlation_id,
+                    oauth_state=state
+                )
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid or expired state parameter"
@@ -148,10 +165,11 @@ class AuthService:
                 )
             
             if not stored_code_verifier:
-                logger.warning("Code verifier not found in OAuth session", extra={
-                    "correlation_id": correlation_id,
-                    "state": state[:8] + "..."
-                })
+                logger.warning(
+                    "Code verifier not found in OAuth session",
+                    correlation_id=correlation_id,
+                    oauth_state=state
+                )
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Code verifier not found in session"
@@ -161,18 +179,20 @@ class AuthService:
             
             # Validate nonce in ID token if present
             if "id_token" in token_data:
-                logger.info("ID token received", extra={
-                    "correlation_id": correlation_id,
-                    "stored_nonce": stored_nonce[:8] + "..."
-                })
+                logger.info(
+                    "ID token received",
+                    correlation_id=correlation_id,
+                    oauth_nonce=stored_nonce
+                )
                 
                 # Validate nonce in ID token to prevent replay attacks
                 try:
                     validate_id_token_nonce(token_data["id_token"], stored_nonce)
-                    logger.info("Nonce validation successful", extra={
-                        "correlation_id": correlation_id,
-                        "nonce": stored_nonce[:8] + "..."
-                    })
+                    logger.info(
+                        "Nonce validation successful",
+                        correlation_id=correlation_id,
+                        oauth_nonce=stored_nonce
+                    )
                 except HTTPException:
                     raise
                 except Exception as e:
@@ -190,31 +210,16 @@ class AuthService:
             
             user = await self._create_or_update_user(google_user, correlation_id)
             
-            oauth_store.delete_session(state)
-            
-            token_payload = {
-                "sub": str(user.id),
-                "email": user.email,
-                "name": user.name,
-                "picture": user.picture_url,
-                "google_id": user.google_id
-            }
-            
-            access_token = create_access_token(token_payload)
+            token_response = self._build_token_response(user)
             
             logger.info("OAuth callback successful", extra={
                 "correlation_id": correlation_id,
-                "user_id": str(user.id),
-                "email": user.email,
-                "google_id": user.google_id
+                "user_id": str(token_response.user.id),
+                "email": token_response.user.email,
+                "google_id": token_response.user.google_id
             })
             
-            return TokenResponse(
-                access_token=access_token,
-                token_type="bearer",
-                expires_in=settings.access_token_expire_minutes * 60,
-                user=UserResponse.model_validate(user)
-            )
+            return token_response
         
         except HTTPException:
             raise
@@ -225,13 +230,50 @@ class AuthService:
                 detail="OAuth callback processing failed"
             )
     
+    def _build_token_response(self, user: User) -> TokenResponse:
+        """
+        Issue an access token for the user and wrap it in a token response.
+        """
+        user_id = user.id
+        email = user.email
+        name = user.name
+        picture_url = user.picture_url
+        google_id = user.google_id
+        
+        access_token = create_access_token({
+            "sub": str(user_id),
+            "email": email,
+            "name": name,
+            "picture": picture_url,
+            "google_id": google_id
+        })
+        
+        # The ORM row has already passed the database constraints, so skip re-validation
+        user_response = UserResponse.model_construct(
+            id=user_id,
+            google_id=google_id,
+            email=email,
+            name=name,
+            picture_url=picture_url,
+            created_at=user.created_at
+        )
+        
+        return TokenResponse(
+            access_token=access_token,
+            token_type="bearer",
+            expires_in=ACCESS_TOKEN_TTL_SECONDS,
+            user=user_response
+        )
+    
     async def _create_or_update_user(self, google_user: GoogleUserInfo, correlation_id: str) -> User:
         """
         Create or update user from Google user info.
         """
         try:
-            stmt = select(User).where(User.google_id == google_user.id)
-            result = await self.db.execute(stmt)
+            if USE_UPSERT:
+                return await self._upsert_user(google_user, correlation_id)
+            
+            result = await self.db.execute(USER_BY_GOOGLE_ID_STMT, {"google_id": google_user.id})
             user = result.scalar_one_or_none()
             
             if user:
@@ -255,8 +297,8 @@ class AuthService:
                     "email": google_user.email
                 })
             
+            # created_at comes back from the INSERT itself (eager_defaults), so no refresh
             await self.db.commit()
-            await self.db.refresh(user)
             
             return user
             
@@ -273,13 +315,39 @@ class AuthService:
                 detail="Failed to create or update user"
             )
     
+    async def _upsert_user(self, google_user: GoogleUserInfo, correlation_id: str) -> User:
+        """
+        Insert or update the user in a single round-trip, RETURNING the stored row.
+        """
+        profile = {
+            "email": google_user.email,
+            "name": google_user.name,
+            "picture_url": google_user.picture
+        }
+        stmt = (
+            pg_insert(User)
+            .values(google_id=google_user.id, **profile)
+            .on_conflict_do_update(index_elements=[User.google_id], set_=profile)
+            .returning(User)
+            .execution_options(populate_existing=True)
+        )
+        result = await self.db.execute(stmt)
+        user = result.scalar_one()
+        await self.db.commit()
+        
+        logger.info("Upserted user", extra={
+            "correlation_id": correlation_id,
+            "user_id": str(user.id)
+        })
+        
+        return user
+    
     async def get_user_by_id(self, user_id: UUID) -> Optional[User]:
         """
         Get user by ID.
         """
         try:
-            stmt = select(User).where(User.id == user_id)
-            result = await self.db.execute(stmt)
+            result = await self.db.execute(USER_BY_ID_STMT, {"id": user_id})
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error("Failed to get user by ID", extra={
@@ -293,8 +361,7 @@ class AuthService:
         Get user by Google ID.
         """
         try:
-            stmt = select(User).where(User.google_id == google_id)
-            result = await self.db.execute(stmt)
+            result = await self.db.execute(USER_BY_GOOGLE_ID_STMT, {"google_id": google_id})
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error("Failed to get user by Google ID", extra={
@@ -308,8 +375,7 @@ class AuthService:
         Get user by email address.
         """
         try:
-            stmt = select(User).where(User.email == email)
-            result = await self.db.execute(stmt)
+            result = await self.db.execute(USER_BY_EMAIL_STMT, {"email": email})
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error("Failed to get user by email", extra={
@@ -323,24 +389,11 @@ class AuthService:
         Refresh user's access token.
         """
         try:
-            token_payload = {
-                "sub": str(user.id),
-                "email": user.email,
-                "name": user.name,
-                "picture": user.picture_url,
-                "google_id": user.google_id
-            }
-            
-            access_token = create_access_token(token_payload)
+            token_response = self._build_token_response(user)
             
-            logger.info("Token refreshed", extra={"user_id": str(user.id)})
+            logger.info("Token refreshed", extra={"user_id": str(token_response.user.id)})
             
-            return TokenResponse(
-                access_token=access_token,
-                token_type="bearer",
-                expires_in=settings.access_token_expire_minutes * 60,
-                user=UserResponse.model_validate(user)
-            )
+            return token_response
             
         except Exception as e:
             logger.error("Failed to refresh token", extra={
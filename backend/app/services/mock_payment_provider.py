@@ -4,22 +4,35 @@ Simulates realistic payment processing with configurable delays, errors, and web
 """
 
 import asyncio
+import heapq
+import itertools
+import logging
+import math
 import random
-import uuid
-from datetime import datetime, timedelta
+import secrets
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Any, Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, ClassVar, Dict, List, Mapping, Optional, Tuple
 from enum import Enum
 
 import httpx
 from fastapi import HTTPException, status
 
 from ..core.config import settings
-from ..core.logging import get_logger
-from ..core.security import generate_correlation_id
+from ..core.logging import get_correlation_id, get_logger
 
 logger = get_logger(__name__)
 
+# Statuses returned by get_payout_status: 40% processing, 50% succeeded, 10% failed
+PROVIDER_STATUSES = ("processing", "succeeded", "failed")
+PROVIDER_STATUS_CUM_WEIGHTS = (0.4, 0.9, 1.0)
+
+
+def utcnow_iso() -> str:
+    """Current UTC time as an ISO 8601 string with millisecond precision."""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
 
 class MockErrorType(str, Enum):
     """Types of errors the mock provider can simulate."""
@@ -34,11 +47,55 @@ class MockErrorType(str, Enum):
 class MockPaymentProvider:
     """Mock payment provider that simulates realistic third-party API behavior."""
     
+    # When set, unconfigured processing delays are a few milliseconds instead of seconds
+    FAST_MODE: ClassVar[bool] = False
+    
+    # Simulated error payloads, shared read-only across all calls
+    _ERROR_RESPONSES: ClassVar[Mapping[MockErrorType, Mapping[str, Any]]] = MappingProxyType({
+        MockErrorType.BAD_REQUEST: MappingProxyType({
+            "status_code": status.HTTP_400_BAD_REQUEST,
+            "error": "invalid_request",
+            "message": "Invalid payout parameters provided"
+        }),
+        MockErrorType.UNAUTHORIZED: MappingProxyType({
+            "status_code": status.HTTP_401_UNAUTHORIZED,
+            "error": "unauthorized",
+            "message": "Invalid API credentials"
+        }),
+        MockErrorType.RATE_LIMITED: MappingProxyType({
+            "status_code": status.HTTP_429_TOO_MANY_REQUESTS,
+            "error": "rate_limited",
+            "message": "Too many requests, please retry later"
+        }),
+        MockErrorType.INTERNAL_ERROR: MappingProxyType({
+            "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+            "error": "internal_error",
+            "message": "Internal server error occurred"
+        }),
+        MockErrorType.TIMEOUT: MappingProxyType({
+            "status_code": status.HTTP_408_REQUEST_TIMEOUT,
+            "error": "timeout",
+            "message": "Request timeout"
+        })
+    })
+    
+    _RATE_LIMITED_HEADERS: ClassVar[Mapping[str, str]] = MappingProxyType({"Retry-After": "1"})
+    
     def __init__(self):
         self.base_url = settings.payment_provider_base_url
         self.timeout = settings.payment_provider_timeout
+        self._simulated_timeout_seconds = self.timeout + 1
         self._webhook_callbacks: List[callable] = []
         self._processing_delays: Dict[str, float] = {}
+        # Private generator so simulated randomness does not share the module-level random state
+        self._rng = random.Random()
+        
+        # Pending webhooks as (due loop time, sequence, job), drained by one scheduler task
+        self._webhook_heap: List[Tuple[float, int, Tuple[str, str, str, str, str]]] = []
+        self._webhook_sequence = itertools.count()
+        self._webhook_wake: Optional[asyncio.Event] = None
+        self._webhook_scheduler_task: Optional[asyncio.Task] = None
+        self._webhook_batch_window = settings.webhook_batch_window_ms / 1000
         
         # Configuration for error simulation
         self.error_rates = {
@@ -49,6 +106,22 @@ class MockPaymentProvider:
             MockErrorType.INTERNAL_ERROR: 0.04,  # 4% internal error
             MockErrorType.TIMEOUT: 0.01,  # 1% timeout
         }
+        self._rebuild_weights()
+    
+    def _rebuild_weights(self):
+        """Precompute the cumulative weights used to sample error types."""
+        self._error_types = list(self.error_rates.keys())
+        self._cum_weights = list(itertools.accumulate(self.error_rates.values()))
+    
+    @classmethod
+    def enable_fast_mode(cls):
+        """Use millisecond processing delays for every provider (intended for tests)."""
+        cls.FAST_MODE = True
+    
+    @classmethod
+    def disable_fast_mode(cls):
+        """Restore realistic processing delays."""
+        cls.FAST_MODE = False
     
     def add_webhook_callback(self, callback: callable):
         """Add a callback function to be called when webhooks are sent."""
@@ -60,22 +133,15 @@ class MockPaymentProvider:
     
     def _determine_error_type(self) -> MockErrorType:
         """Determine what type of error to simulate based on configured rates."""
-        rand = random.random()
-        cumulative = 0.0
-        
-        for error_type, rate in self.error_rates.items():
-            cumulative += rate
-            if rand <= cumulative:
-                return error_type
-        
-        return MockErrorType.SUCCESS
+        return self._rng.choices(self._error_types, cum_weights=self._cum_weights)[0]
     
     def _simulate_processing_delay(self, payout_id: str) -> float:
         """Simulate realistic processing delay."""
-        if payout_id in self._processing_delays:
-            delay = self._processing_delays[payout_id]
-        else:
-            delay = random.uniform(1.0, 5.0)
+        delay = self._processing_delays.get(payout_id)
+        if delay is None:
+            delay = self._rng.uniform(0.001, 0.005) if self.FAST_MODE else self._rng.uniform(1.0, 5.0)
+        elif delay <= 0:
+            return 0.0
         
         return delay
     
@@ -106,7 +172,7 @@ class MockPaymentProvider:
             HTTPException: Simulated API errors
         """
         if not correlation_id:
-            correlation_id = generate_correlation_id()
+            correlation_id = get_correlation_id()
         
         logger.info("Mock provider: Creating payout", extra={
             "correlation_id": correlation_id,
@@ -117,20 +183,22 @@ class MockPaymentProvider:
         })
         
         delay = self._simulate_processing_delay(payout_id)
-        logger.debug("Mock provider: Simulating processing delay", extra={
-            "correlation_id": correlation_id,
-            "payout_id": payout_id,
-            "delay_seconds": delay
-        })
+        if logger.is_enabled_for(logging.DEBUG):
+            logger.debug("Mock provider: Simulating processing delay", extra={
+                "correlation_id": correlation_id,
+                "payout_id": payout_id,
+                "delay_seconds": delay
+            })
         
-        await asyncio.sleep(delay)
+        if delay:
+            await asyncio.sleep(delay)
         
         error_type = self._determine_error_type()
         
         logger.info("Mock provider: Determined response type", extra={
             "correlation_id": correlation_id,
             "payout_id": payout_id,
-            "error_type": error_type.value
+            "error_type": error_type
         })
         
         if error_type == MockErrorType.SUCCESS:
@@ -150,7 +218,7 @@ class MockPaymentProvider:
         correlation_id: str
     ) -> Dict[str, Any]:
         """Handle successful payout creation."""
-        provider_reference = f"mock_ref_{uuid.uuid4().hex[:16]}"
+        provider_reference = f"mock_ref_{secrets.token_hex(8)}"
         
         response = {
             "id": payout_id,
@@ -159,7 +227,7 @@ class MockPaymentProvider:
             "amount": str(amount),
             "currency": currency,
             "status": "processing",
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": utcnow_iso(),
             "metadata": metadata or {}
         }
         
@@ -169,11 +237,9 @@ class MockPaymentProvider:
             "provider_reference": provider_reference
         })
         
-        webhook_delay = random.uniform(2.0, 10.0)
-        asyncio.create_task(
-            self._send_webhook_callback(
-                payout_id, provider_reference, "succeeded", webhook_delay, correlation_id, reference
-            )
+        webhook_delay = self._rng.uniform(2.0, 10.0)
+        self._schedule_webhook_callback(
+            payout_id, provider_reference, "succeeded", webhook_delay, correlation_id, reference
         )
         
         return response
@@ -185,45 +251,17 @@ class MockPaymentProvider:
         correlation_id: str
     ) -> Dict[str, Any]:
         """Handle error responses from mock provider."""
-        error_responses = {
-            MockErrorType.BAD_REQUEST: {
-                "status_code": status.HTTP_400_BAD_REQUEST,
-                "error": "invalid_request",
-                "message": "Invalid payout parameters provided"
-            },
-            MockErrorType.UNAUTHORIZED: {
-                "status_code": status.HTTP_401_UNAUTHORIZED,
-                "error": "unauthorized",
-                "message": "Invalid API credentials"
-            },
-            MockErrorType.RATE_LIMITED: {
-                "status_code": status.HTTP_429_TOO_MANY_REQUESTS,
-                "error": "rate_limited",
-                "message": "Too many requests, please retry later"
-            },
-            MockErrorType.INTERNAL_ERROR: {
-                "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
-                "error": "internal_error",
-                "message": "Internal server error occurred"
-            },
-            MockErrorType.TIMEOUT: {
-                "status_code": status.HTTP_408_REQUEST_TIMEOUT,
-                "error": "timeout",
-                "message": "Request timeout"
-            }
-        }
-        
-        error_info = error_responses[error_type]
+        error_info = self._ERROR_RESPONSES[error_type]
         
         logger.warning("Mock provider: Simulating error response", extra={
             "correlation_id": correlation_id,
             "payout_id": payout_id,
-            "error_type": error_type.value,
+            "error_type": error_type,
             "status_code": error_info["status_code"]
         })
         
         if error_type == MockErrorType.TIMEOUT:
-            await asyncio.sleep(self.timeout + 1)
+            await asyncio.sleep(self._simulated_timeout_seconds)
         
         raise HTTPException(
             status_code=error_info["status_code"],
@@ -232,10 +270,11 @@ class MockPaymentProvider:
                 "message": error_info["message"],
                 "payout_id": payout_id,
                 "correlation_id": correlation_id
-            }
+            },
+            headers=self._RATE_LIMITED_HEADERS if error_type == MockErrorType.RATE_LIMITED else None
         )
     
-    async def _send_webhook_callback(
+    def _schedule_webhook_callback(
         self,
         payout_id: str,
         provider_reference: str,
@@ -244,7 +283,7 @@ class MockPaymentProvider:
         correlation_id: str,
         reference: str
     ):
-        """Send webhook callback after delay."""
+        """Queue a webhook callback to be sent by the scheduler after the delay."""
         logger.info("Mock provider: Scheduling webhook callback", extra={
             "correlation_id": correlation_id,
             "payout_id": payout_id,
@@ -253,50 +292,125 @@ class MockPaymentProvider:
             "delay_seconds": delay_seconds
         })
         
-        await asyncio.sleep(delay_seconds)
+        loop = asyncio.get_running_loop()
+        self._ensure_webhook_scheduler(loop)
         
-        webhook_data = {
-            "id": reference,  # Use payout reference, not payout ID
-            "provider_reference": provider_reference,
-            "status": status,
-            "timestamp": datetime.utcnow().isoformat(),
-            "correlation_id": correlation_id
-        }
+        # The sequence number breaks ties so payloads are never compared
+        heapq.heappush(self._webhook_heap, (
+            loop.time() + delay_seconds,
+            next(self._webhook_sequence),
+            (payout_id, provider_reference, status, correlation_id, reference)
+        ))
+        self._webhook_wake.set()
+    
+    def _ensure_webhook_scheduler(self, loop: asyncio.AbstractEventLoop):
+        """Start the scheduler task on the running loop if it is not already running there."""
+        task = self._webhook_scheduler_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        
+        self._webhook_wake = asyncio.Event()
+        self._webhook_scheduler_task = loop.create_task(self._webhook_loop())
+    
+    async def _webhook_loop(self):
+        """Sleep until the earliest queued webhook is due, then send every due webhook together."""
+        loop = asyncio.get_running_loop()
+        heap = self._webhook_heap
+        wake = self._webhook_wake
+        
+        while True:
+            timeout = heap[0][0] - loop.time() if heap else None
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+                continue
+            
+            # Pull in everything due within the batch window so bursts go out together
+            horizon = loop.time() + self._webhook_batch_window
+            due = []
+            while heap and heap[0][0] <= horizon:
+                due.append(heapq.heappop(heap)[2])
+            
+            await self._send_webhook_callbacks(due)
+    
+    async def stop_webhook_scheduler(self):
+        """Cancel the scheduler task; queued webhooks that are not yet due are dropped."""
+        task = self._webhook_scheduler_task
+        self._webhook_scheduler_task = None
+        self._webhook_heap.clear()
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _send_webhook_callbacks(self, jobs: List[Tuple[str, str, str, str, str]]):
+        """
+        Send a batch of webhooks to every registered callback.
         
-        logger.info("Mock provider: Sending webhook callback", extra={
-            "correlation_id": correlation_id,
-            "payout_id": payout_id,
-            "provider_reference": provider_reference,
-            "status": status,
-            "webhook_data": webhook_data
-        })
+        Callbacks with a truthy ``supports_batch`` attribute receive the whole batch as a
+        list in one call; all other callbacks are called once per webhook.
+        """
+        batch = []
+        for payout_id, provider_reference, status, correlation_id, reference in jobs:
+            webhook_data = {
+                "id": reference,  # Use payout reference, not payout ID
+                "provider_reference": provider_reference,
+                "status": status,
+                "timestamp": utcnow_iso(),
+                "correlation_id": correlation_id
+            }
+            batch.append((payout_id, webhook_data))
+            
+            logger.info("Mock provider: Sending webhook callback", extra={
+                "correlation_id": correlation_id,
+                "payout_id": payout_id,
+                "provider_reference": provider_reference,
+                "status": status,
+                "webhook_data": webhook_data
+            })
+        
+        # Snapshot the list so results line up with callbacks even if one is registered meanwhile
+        callbacks = tuple(self._webhook_callbacks)
         
         logger.info("Mock provider: Calling webhook callbacks", extra={
-            "correlation_id": correlation_id,
-            "payout_id": payout_id,
-            "callback_count": len(self._webhook_callbacks)
+            "batch_size": len(batch),
+            "callback_count": len(callbacks)
         })
         
-        for callback in self._webhook_callbacks:
-            try:
-                logger.info("Mock provider: Executing webhook callback", extra={
-                    "correlation_id": correlation_id,
-                    "payout_id": payout_id,
-                    "callback": callback.__name__
-                })
-                await callback(webhook_data)
-                logger.info("Mock provider: Webhook callback completed", extra={
-                    "correlation_id": correlation_id,
-                    "payout_id": payout_id,
-                    "callback": callback.__name__
-                })
-            except Exception as e:
-                logger.error("Mock provider: Webhook callback failed", extra={
-                    "correlation_id": correlation_id,
-                    "payout_id": payout_id,
-                    "error": str(e),
-                    "callback": callback.__name__
-                })
+        calls = []
+        for callback in callbacks:
+            if getattr(callback, "supports_batch", False):
+                calls.append((callback, batch, callback([webhook_data for _, webhook_data in batch])))
+            else:
+                calls.extend(
+                    (callback, [item], callback(item[1])) for item in batch
+                )
+        
+        results = await asyncio.gather(*(call for _, _, call in calls), return_exceptions=True)
+        
+        log_callbacks = logger.is_enabled_for(logging.INFO)
+        for (callback, items, _), result in zip(calls, results):
+            if not isinstance(result, Exception) and not log_callbacks:
+                continue
+            for payout_id, webhook_data in items:
+                if isinstance(result, Exception):
+                    logger.error("Mock provider: Webhook callback failed", extra={
+                        "correlation_id": webhook_data["correlation_id"],
+                        "payout_id": payout_id,
+                        "error": str(result),
+                        "callback": callback.__name__
+                    })
+                else:
+                    logger.info("Mock provider: Webhook callback completed", extra={
+                        "correlation_id": webhook_data["correlation_id"],
+                        "payout_id": payout_id,
+                        "callback": callback.__name__
+                    })
     
     async def get_payout_status(
         self,
@@ -316,7 +430,7 @@ class MockPaymentProvider:
             Status response from mock provider
         """
         if not correlation_id:
-            correlation_id = generate_correlation_id()
+            correlation_id = get_correlation_id()
         
         logger.info("Mock provider: Getting payout status", extra={
             "correlation_id": correlation_id,
@@ -324,16 +438,15 @@ class MockPaymentProvider:
             "provider_reference": provider_reference
         })
         
-        await asyncio.sleep(random.uniform(0.1, 0.5))
+        await asyncio.sleep(self._rng.uniform(0.1, 0.5))
         
-        statuses = ["processing", "succeeded", "failed"]
-        status = random.choice(statuses)
+        status = self._rng.choices(PROVIDER_STATUSES, cum_weights=PROVIDER_STATUS_CUM_WEIGHTS)[0]
         
         response = {
             "id": payout_id,
             "provider_reference": provider_reference,
             "status": status,
-            "checked_at": datetime.utcnow().isoformat(),
+            "checked_at": utcnow_iso(),
             "correlation_id": correlation_id
         }
         
@@ -348,11 +461,13 @@ class MockPaymentProvider:
     
     def configure_error_rates(self, error_rates: Dict[MockErrorType, float]):
         """Configure error rates for different error types."""
-        total_rate = sum(error_rates.values())
-        if abs(total_rate - 1.0) > 0.01:
+        total_rate = math.fsum(error_rates.values())
+        if abs(total_rate - 1.0) > 1e-9:
             raise ValueError(f"Error rates must sum to 1.0, got {total_rate}")
         
-        self.error_rates = error_rates
+        # Copy so later changes to the caller's dict cannot desync the cumulative weights
+        self.error_rates = dict(error_rates)
+        self._rebuild_weights()
         logger.info("Mock provider: Error rates configured", extra={
             "error_rates": {k.value: v for k, v in error_rates.items()}
         })
@@ -367,6 +482,7 @@ class MockPaymentProvider:
             MockErrorType.INTERNAL_ERROR: 0.04,
             MockErrorType.TIMEOUT: 0.01,
         }
+        self._rebuild_weights()
         self._processing_delays.clear()
         logger.info("Mock provider: Configuration reset to defaults")
 
@@ -3,47 +3,163 @@ Payout service for handling payout creation, processing, and status management.
 Implements idempotency, retry logic, rate limiting, and integration with mock payment provider.
 """
 
-import uuid
+import asyncio
+import logging
+import secrets
+from collections import OrderedDict
 from datetime import datetime
 from decimal import Decimal
 from typing import Any, Dict, List, Optional, Tuple
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import bindparam, func, insert, select, tuple_, update
 from sqlalchemy.exc import IntegrityError
-from fastapi import HTTPException, status
+from fastapi import BackgroundTasks, HTTPException, status
 
-from ..core.logging import get_logger
-from ..core.security import generate_correlation_id
+from ..core.logging import get_correlation_id, get_logger
 from ..core.errors import (
     create_database_error,
     create_payment_provider_error,
     create_internal_server_error,
     create_conflict_error
 )
+from ..db.session import SessionLocal
 from ..models.payout import Payout, PayoutStatus
 from ..models.user import User
 from ..schemas.payouts import PayoutCreate, PayoutRead, PayoutList
 from ..utils.retry import retry_async, PAYMENT_API_RETRY_CONFIG, RetryError
 from .mock_payment_provider import mock_payment_provider
-from .rate_limiter import rate_limiter_service, RateLimitExceeded, create_rate_limit_exception
+from .rate_limiter import (
+    rate_limiter_service,
+    RateLimitExceeded,
+    create_rate_limit_exception,
+    rate_limit_headers
+)
 
 logger = get_logger(__name__)
 
+IDEMPOTENCY_CACHE_SIZE = 4096
+# Only settled payouts are cached; pending/processing ones still change via webhooks
+CACHEABLE_PAYOUT_STATUSES = frozenset({
+    PayoutStatus.succeeded, PayoutStatus.failed, PayoutStatus.cancelled
+})
+
+# Shared across requests since PayoutService is instantiated per request
+_idempotency_cache: "OrderedDict[str, PayoutRead]" = OrderedDict()
+
+
+# Columns rendered in payout listings. Metadata blobs, error details and the
+# correlation ID are only returned when a single payout is fetched.
+PAYOUT_LIST_COLUMNS = (
+    Payout.id,
+    Payout.reference,
+    Payout.user_id,
+    Payout.amount,
+    Payout.currency,
+    Payout.status,
+    Payout.provider_reference,
+    Payout.provider_status,
+    Payout.idempotency_key,
+    Payout.retry_count,
+    Payout.last_attempt_at,
+    Payout.webhook_received_at,
+    Payout.created_at,
+    Payout.updated_at,
+)
+
+# Built once at import so each call only binds parameters
+PAYOUT_BY_IDEMPOTENCY_KEY_STMT = select(Payout).where(
+    Payout.idempotency_key == bindparam("idempotency_key")
+)
+USER_PAYOUT_BY_ID_STMT = select(Payout).where(
+    Payout.id == bindparam("payout_id"),
+    Payout.user_id == bindparam("user_id")
+)
+USER_PAYOUT_COUNT_STMT = (
+    select(func.count()).select_from(Payout).where(Payout.user_id == bindparam("user_id"))
+)
+_USER_PAYOUT_PAGE_STMT = (
+    select(*PAYOUT_LIST_COLUMNS)
+    .where(Payout.user_id == bindparam("user_id"))
+    # id breaks created_at ties, so a keyset cursor never skips or repeats a row
+    .order_by(Payout.created_at.desc(), Payout.id.desc())
+    .limit(bindparam("limit"))
+)
+# Offset pages carry the user's total as a window count, saving the separate COUNT query
+USER_PAYOUT_PAGE_BY_OFFSET_STMT = _USER_PAYOUT_PAGE_STMT.add_columns(
+    func.count().over().label("total")
+).offset(bindparam("offset"))
+USER_PAYOUT_PAGE_BEFORE_STMT = _USER_PAYOUT_PAGE_STMT.where(
+    tuple_(Payout.created_at, Payout.id)
+    < tuple_(bindparam("created_before"), bindparam("before_id"))
+)
+
+
+def payout_read_from_row(row) -> PayoutRead:
+    """Build a PayoutRead from a trusted listing row without running validation."""
+    return PayoutRead.model_construct(
+        id=str(row.id),
+        reference=row.reference,
+        user_id=str(row.user_id) if row.user_id is not None else None,
+        amount=row.amount,
+        currency=row.currency,
+        status=row.status,
+        provider_reference=row.provider_reference,
+        provider_status=row.provider_status,
+        idempotency_key=row.idempotency_key,
+        retry_count=int(row.retry_count),
+        last_attempt_at=row.last_attempt_at,
+        webhook_received_at=row.webhook_received_at,
+        created_at=row.created_at,
+        updated_at=row.updated_at,
+    )
+
+
+async def process_payout_in_background(payout: Payout, correlation_id: str) -> None:
+    """Send a created payout to the provider on its own session, after the response is sent."""
+    async with SessionLocal() as db:
+        await PayoutService(db)._submit_payout_to_provider(payout, correlation_id)
+
+
+def get_cached_payout(idempotency_key: str) -> Optional[PayoutRead]:
+    """Return the cached payout for an idempotency key, marking it recently used."""
+    payout = _idempotency_cache.get(idempotency_key)
+    if payout is not None:
+        _idempotency_cache.move_to_end(idempotency_key)
+    return payout
+
+
+def cache_payout(idempotency_key: str, payout: PayoutRead) -> None:
+    """Cache a settled payout, evicting the least recently used entry when full."""
+    if payout.status not in CACHEABLE_PAYOUT_STATUSES:
+        return
+    _idempotency_cache[idempotency_key] = payout
+    _idempotency_cache.move_to_end(idempotency_key)
+    if len(_idempotency_cache) > IDEMPOTENCY_CACHE_SIZE:
+        _idempotency_cache.popitem(last=False)
+
+
+def invalidate_cached_payout(idempotency_key: str) -> None:
+    """Drop a cached payout after its status changes."""
+    _idempotency_cache.pop(idempotency_key, None)
+
 
 class PayoutService:
     """Service for handling payout operations with business logic."""
     
     def __init__(self, db: AsyncSession):
         self.db = db
+        # X-RateLimit-* headers from the last payout rate limit check, for the route to send
+        self.rate_limit_headers: Dict[str, str] = {}
     
     async def create_payout(
         self,
         payout_data: PayoutCreate,
         user: User,
         idempotency_key: str,
-        correlation_id: Optional[str] = None
+        correlation_id: Optional[str] = None,
+        background_tasks: Optional[BackgroundTasks] = None
     ) -> PayoutRead:
         """
         Create a new payout with idempotency, rate limiting, and retry logic.
@@ -53,6 +169,8 @@ class PayoutService:
             user: User creating the payout
             idempotency_key: Idempotency key for duplicate prevention
             correlation_id: Correlation ID for logging
+            background_tasks: When given, the provider call is queued here and the
+                pending payout is returned without waiting for it
             
         Returns:
             Created payout information
@@ -61,7 +179,7 @@ class PayoutService:
             HTTPException: For various error scenarios
         """
         if not correlation_id:
-            correlation_id = generate_correlation_id()
+            correlation_id = get_correlation_id()
         
         logger.info("Creating payout", extra={
             "correlation_id": correlation_id,
@@ -71,24 +189,49 @@ class PayoutService:
             "idempotency_key": idempotency_key
         })
         
-        try:
-            rate_limit_info = rate_limiter_service.check_payout_rate_limit(
-                str(user.id), correlation_id
+        # Retries of settled payouts are answered from memory, but still count against the limit
+        cached_payout = get_cached_payout(idempotency_key)
+        
+        # The rate limit check and the idempotency lookup are independent, so overlap them
+        if cached_payout is None:
+            rate_limit_info, existing_payout = await asyncio.gather(
+                rate_limiter_service.check_payout_rate_limit(str(user.id), correlation_id),
+                self._get_payout_by_idempotency_key(idempotency_key),
+                return_exceptions=True
             )
-            logger.debug("Rate limit check passed", extra={
+        else:
+            (rate_limit_info,) = await asyncio.gather(
+                rate_limiter_service.check_payout_rate_limit(str(user.id), correlation_id),
+                return_exceptions=True
+            )
+            existing_payout = cached_payout
+        
+        if isinstance(rate_limit_info, RateLimitExceeded):
+            logger.warning("Rate limit exceeded for payout creation", extra={
                 "correlation_id": correlation_id,
                 "user_id": str(user.id),
-                "remaining_requests": rate_limit_info["remaining_requests"]
+                "retry_after": rate_limit_info.retry_after
             })
-        except RateLimitExceeded as e:
-            logger.warning("Rate limit exceeded for payout creation", extra={
+            raise create_rate_limit_exception(
+                rate_limit_info.retry_after, correlation_id, headers=rate_limit_info.headers
+            )
+        if isinstance(rate_limit_info, BaseException):
+            raise rate_limit_info
+        if isinstance(existing_payout, BaseException):
+            raise existing_payout
+        
+        if "limit" in rate_limit_info:
+            self.rate_limit_headers = rate_limit_headers(
+                rate_limit_info["limit"], rate_limit_info["remaining_requests"], rate_limit_info["reset_time"]
+            )
+        
+        if logger.is_enabled_for(logging.DEBUG):
+            logger.debug("Rate limit check passed", extra={
                 "correlation_id": correlation_id,
                 "user_id": str(user.id),
-                "retry_after": e.retry_after
+                "remaining_requests": rate_limit_info["remaining_requests"]
             })
-            raise create_rate_limit_exception(e.retry_after, correlation_id)
         
-        existing_payout = await self._get_payout_by_idempotency_key(idempotency_key)
         if existing_payout:
             logger.info("Payout already exists with idempotency key", extra={
                 "correlation_id": correlation_id,
@@ -96,27 +239,28 @@ class PayoutService:
                 "idempotency_key": idempotency_key,
                 "status": existing_payout.status
             })
-            return PayoutRead.model_validate(existing_payout)
+            if existing_payout is cached_payout:
+                return cached_payout
+            payout_read = PayoutRead.model_validate(existing_payout)
+            cache_payout(idempotency_key, payout_read)
+            return payout_read
         
         payout = await self._create_payout_in_db(
             payout_data, user, idempotency_key, correlation_id
         )
         
-        try:
-            await self._process_payout_with_provider(payout, correlation_id)
-        except Exception as e:
-            logger.error("Failed to process payout with provider", extra={
+        if background_tasks is not None:
+            background_tasks.add_task(process_payout_in_background, payout, correlation_id)
+            
+            logger.info("Payout queued for provider processing", extra={
                 "correlation_id": correlation_id,
                 "payout_id": payout.id,
-                "error": str(e),
-                "error_type": type(e).__name__
+                "status": payout.status
             })
-            await self._update_payout_status(
-                payout.id, PayoutStatus.failed, correlation_id,
-                error_code="provider_error", error_message=str(e)
-            )
+            
+            return PayoutRead.model_validate(payout)
         
-        await self.db.refresh(payout)
+        await self._submit_payout_to_provider(payout, correlation_id)
         
         logger.info("Payout created successfully", extra={
             "correlation_id": correlation_id,
@@ -125,13 +269,16 @@ class PayoutService:
             "provider_reference": payout.provider_reference
         })
         
-        return PayoutRead.model_validate(payout)
+        payout_read = PayoutRead.model_validate(payout)
+        cache_payout(idempotency_key, payout_read)
+        return payout_read
     
     async def _get_payout_by_idempotency_key(self, idempotency_key: str) -> Optional[Payout]:
         """Get existing payout by idempotency key."""
         try:
-            stmt = select(Payout).where(Payout.idempotency_key == idempotency_key)
-            result = await self.db.execute(stmt)
+            result = await self.db.execute(
+                PAYOUT_BY_IDEMPOTENCY_KEY_STMT, {"idempotency_key": idempotency_key}
+            )
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error("Failed to get payout by idempotency key", extra={
@@ -149,9 +296,10 @@ class PayoutService:
     ) -> Payout:
         """Create payout in database within transaction."""
         try:
-            reference = payout_data.reference or f"PAY_{uuid.uuid4().hex[:16].upper()}"
+            reference = payout_data.reference or f"PAY_{secrets.token_hex(8).upper()}"
             
-            payout = Payout(
+            # A single INSERT ... RETURNING skips the unit-of-work flush and the refresh SELECT
+            stmt = insert(Payout).values(
                 reference=reference,
                 user_id=user.id,
                 amount=payout_data.amount,
@@ -160,11 +308,11 @@ class PayoutService:
                 idempotency_key=idempotency_key,
                 metadata_json=payout_data.metadata_json,
                 correlation_id=UUID(correlation_id) if correlation_id else None
-            )
+            ).returning(Payout)
             
-            self.db.add(payout)
+            result = await self.db.execute(stmt)
+            payout = result.scalar_one()
             await self.db.commit()
-            await self.db.refresh(payout)
             
             logger.info("Payout created in database", extra={
                 "correlation_id": correlation_id,
@@ -213,6 +361,22 @@ class PayoutService:
                     correlation_id=correlation_id
                 )
     
+    async def _submit_payout_to_provider(self, payout: Payout, correlation_id: str) -> None:
+        """Process payout with the provider, marking it failed on unexpected errors."""
+        try:
+            await self._process_payout_with_provider(payout, correlation_id)
+        except Exception as e:
+            logger.error("Failed to process payout with provider", extra={
+                "correlation_id": correlation_id,
+                "payout_id": payout.id,
+                "error": str(e),
+                "error_type": type(e).__name__
+            })
+            await self._update_payout_status(
+                payout.id, PayoutStatus.failed, correlation_id,
+                error_code="provider_error", error_message=str(e)
+            )
+    
     async def _process_payout_with_provider(
         self,
         payout: Payout,
@@ -226,10 +390,8 @@ class PayoutService:
             "currency": payout.currency
         })
         
-        await self._update_payout_status(
-            payout.id, PayoutStatus.processing, correlation_id
-        )
-        
+        # The processing status is written together with the provider response below,
+        # saving a separate commit before the provider call
         try:
             provider_response = await retry_async(
                 mock_payment_provider.create_payout,
@@ -242,8 +404,10 @@ class PayoutService:
                 config=PAYMENT_API_RETRY_CONFIG
             )
             
-            await self._update_payout_with_provider_response(
-                payout.id, provider_response, correlation_id
+            await self._update_payout_status(
+                payout.id, PayoutStatus.processing, correlation_id,
+                provider_reference=provider_response.get("provider_reference"),
+                provider_status=provider_response.get("status")
             )
             
             logger.info("Payout processed successfully with provider", extra={
@@ -303,10 +467,8 @@ class PayoutService:
     ) -> None:
         """Update payout status in database."""
         try:
-            update_data = {
-                "status": status,
-                "updated_at": datetime.utcnow()
-            }
+            # updated_at is set by the column's onupdate=func.now()
+            update_data = {"status": status}
             
             if error_code:
                 update_data["error_code"] = error_code
@@ -317,7 +479,15 @@ class PayoutService:
             if provider_status:
                 update_data["provider_status"] = provider_status
             
-            stmt = update(Payout).where(Payout.id == payout_id).values(**update_data)
+            # RETURNING the row refreshes the loaded payout, onupdate columns included,
+            # so callers need no refresh() round-trip afterwards
+            stmt = (
+                update(Payout)
+                .where(Payout.id == payout_id)
+                .values(**update_data)
+                .returning(Payout)
+                .execution_options(populate_existing=True)
+            )
             await self.db.execute(stmt)
             await self.db.commit()
             
@@ -351,22 +521,6 @@ class PayoutService:
                     correlation_id=correlation_id
                 )
     
-    async def _update_payout_with_provider_response(
-        self,
-        payout_id: UUID,
-        provider_response: Dict[str, Any],
-        correlation_id: str
-    ) -> None:
-        """Update payout with provider response data."""
-        provider_reference = provider_response.get("provider_reference")
-        provider_status = provider_response.get("status")
-        
-        await self._update_payout_status(
-            payout_id, PayoutStatus.processing, correlation_id,
-            provider_reference=provider_reference,
-            provider_status=provider_status
-        )
-    
     async def get_payout_by_id(
         self,
         payout_id: UUID,
@@ -375,14 +529,12 @@ class PayoutService:
     ) -> Optional[PayoutRead]:
         """Get payout by ID for a specific user."""
         if not correlation_id:
-            correlation_id = generate_correlation_id()
+            correlation_id = get_correlation_id()
         
         try:
-            stmt = select(Payout).where(
-                Payout.id == payout_id,
-                Payout.user_id == user.id
+            result = await self.db.execute(
+                USER_PAYOUT_BY_ID_STMT, {"payout_id": payout_id, "user_id": user.id}
             )
-            result = await self.db.execute(stmt)
             payout = result.scalar_one_or_none()
             
             if payout:
@@ -415,11 +567,20 @@ class PayoutService:
         user: User,
         page: int = 1,
         page_size: int = 20,
-        correlation_id: Optional[str] = None
+        correlation_id: Optional[str] = None,
+        created_before: Optional[datetime] = None,
+        before_id: Optional[UUID] = None
     ) -> PayoutList:
-        """Get paginated list of payouts for a user."""
+        """
+        Get paginated list of payouts for a user.
+        
+        When ``created_before`` and ``before_id`` are given (the ``created_at`` and ``id``
+        of the last payout on the previous page), the page is read by keyset instead of
+        OFFSET, so deep pages cost the same as the first one. ``page`` is ignored then
+        and returned as None.
+        """
         if not correlation_id:
-            correlation_id = generate_correlation_id()
+            correlation_id = get_correlation_id()
         
         try:
             if page < 1:
@@ -429,21 +590,30 @@ class PayoutService:
             
             offset = (page - 1) * page_size
             
-            count_stmt = select(Payout).where(Payout.user_id == user.id)
-            count_result = await self.db.execute(count_stmt)
-            total = len(count_result.scalars().all())
+            # Select only the listed columns; unselected optional fields fall back to None
+            if created_before is not None:
+                result = await self.db.execute(USER_PAYOUT_PAGE_BEFORE_STMT, {
+                    "user_id": user.id,
+                    "limit": page_size,
+                    "created_before": created_before,
+                    "before_id": before_id
+                })
+                rows = result.all()
+                total = None
+                page = None
+            else:
+                result = await self.db.execute(USER_PAYOUT_PAGE_BY_OFFSET_STMT, {
+                    "user_id": user.id, "limit": page_size, "offset": offset
+                })
+                rows = result.all()
+                total = rows[0].total if rows else None
             
-            stmt = (
-                select(Payout)
-                .where(Payout.user_id == user.id)
-                .order_by(Payout.created_at.desc())
-                .offset(offset)
-                .limit(page_size)
-            )
-            result = await self.db.execute(stmt)
-            payouts = result.scalars().all()
+            # A keyset page only counts rows past the cursor, and a page past the end
+            # has no rows to carry the window count, so count separately there
+            if total is None:
+                total = (await self.db.execute(USER_PAYOUT_COUNT_STMT, {"user_id": user.id})).scalar_one()
             
-            payout_reads = [PayoutRead.model_validate(payout) for payout in payouts]
+            payout_reads = [payout_read_from_row(row) for row in rows]
             
             logger.info("Payouts listed", extra={
                 "correlation_id": correlation_id,
@@ -482,59 +652,3 @@ class PayoutService:
                     message="Unable to load payouts. Please try again",
                     correlation_id=correlation_id
                 )
-    
-    async def update_payout_from_webhook(
-        self,
-        payout_id: UUID,
-        provider_reference: str,
-        status: str,
-        correlation_id: str
-    ) -> bool:
-        """Update payout status from webhook callback."""
-        try:
-            stmt = select(Payout).where(
-                Payout.provider_reference == provider_reference
-            )
-            result = await self.db.execute(stmt)
-            payout = result.scalar_one_or_none()
-            
-            if not payout:
-                logger.warning("Payout not found for webhook", extra={
-                    "correlation_id": correlation_id,
-                    "provider_reference": provider_reference,
-                    "status": status
-                })
-                return False
-            
-            payout_status = PayoutStatus.processing
-            if status == "succeeded":
-                payout_status = PayoutStatus.succeeded
-            elif status == "failed":
-                payout_status = PayoutStatus.failed
-            elif status == "cancelled":
-                payout_status = PayoutStatus.cancelled
-            
-            await self._update_payout_status(
-                payout.id, payout_status, correlation_id,
-                provider_status=status,
-                provider_reference=provider_reference
-            )
-            
-            logger.info("Payout updated from webhook", extra={
-                "correlation_id": correlation_id,
-                "payout_id": payout.id,
-                "provider_reference": provider_reference,
-                "status": payout_status,
-                "provider_status": status
-            })
-            
-            return True
-            
-        except Exception as e:
-            logger.error("Failed to update payout from webhook", extra={
-                "correlation_id": correlation_id,
-                "provider_reference": provider_reference,
-                "status": status,
-                "error": str(e)
-            })
-            return False
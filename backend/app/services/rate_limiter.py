@@ -1,72 +1,199 @@
 """
-In-memory rate limiting service for API endpoints.
-Implements sliding window rate limiting with configurable limits per user.
+Rate limiting service for API endpoints.
+Implements in-memory sliding window counter rate limiting with configurable limits per user,
+and a Redis-backed sliding log for payouts when Redis is configured.
 """
 
+import logging
+import math
+import secrets
+import threading
 import time
-from collections import defaultdict, deque
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 from fastapi import HTTPException, status
 
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - redis is only needed for shared limits
+    aioredis = None
+
 from ..core.config import settings
-from ..core.logging import get_logger
-from ..core.security import generate_correlation_id
+from ..core.logging import get_correlation_id, get_logger
 from ..core.errors import create_rate_limit_error
 
 logger = get_logger(__name__)
 
+# Power of two so a user's shard is picked with a bit mask
+RATE_LIMIT_SHARD_COUNT = 64
+
+# "sliding_counter" weights in the previous window; "fixed" only counts the current one
+RATE_LIMIT_STRATEGIES = ("sliding_counter", "fixed")
+
+
+def rate_limit_headers(limit: int, remaining: int, reset_time: int) -> Dict[str, str]:
+    """Build X-RateLimit-* response headers from a limiter's own numbers."""
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset_time)
+    }
+
 
 class RateLimitExceeded(Exception):
     """Raised when rate limit is exceeded."""
     
-    def __init__(self, message: str, retry_after: int):
+    def __init__(
+        self,
+        message: str,
+        retry_after: int,
+        limit: Optional[int] = None,
+        reset_time: Optional[int] = None
+    ):
         super().__init__(message)
         self.retry_after = retry_after
+        self.limit = limit
+        self.reset_time = reset_time
+    
+    @property
+    def headers(self) -> Dict[str, str]:
+        """X-RateLimit-* headers for the rejected request, when the limiter supplied them."""
+        if self.limit is None or self.reset_time is None:
+            return {}
+        return rate_limit_headers(self.limit, 0, self.reset_time)
 
 
 class SlidingWindowRateLimiter:
     """
-    In-memory sliding window rate limiter.
+    In-memory sliding window counter rate limiter.
+    
+    Time is cut into fixed windows of ``window_size_seconds``. Each user keeps only the
+    request counts of the current and previous window, and usage is estimated as
+    ``prev * (1 - elapsed / window) + curr``, which tracks a true sliding window
+    closely while making every check O(1) regardless of the limit. With
+    ``strategy="fixed"`` only the current window is counted, which is cheaper and
+    precise enough for coarse limits spanning several minutes.
     
-    Uses a deque to store timestamps of requests within the window.
-    Automatically cleans up old entries to prevent memory leaks.
+    State is split across ``RATE_LIMIT_SHARD_COUNT`` dicts by user hash, each guarded by
+    its own lock so checks stay atomic when called from worker threads or on
+    free-threaded builds. Shards are kept in least-recently-seen order, so idle users
+    are evicted from the front in O(1) without scanning the shard.
     """
     
-    def __init__(self, window_size_seconds: int = 60, max_requests: int = None):
+    __slots__ = (
+        "window_size_seconds",
+        "_window_size_ns",
+        "max_requests",
+        "strategy",
+        "_fixed_window",
+        "_shards",
+        "_shard_locks",
+        "_shard_requests",
+    )
+    
+    def __init__(
+        self,
+        window_size_seconds: int = 60,
+        max_requests: int = None,
+        strategy: str = "sliding_counter"
+    ):
+        if strategy not in RATE_LIMIT_STRATEGIES:
+            raise ValueError(f"Unknown rate limit strategy: {strategy}")
+        
         self.window_size_seconds = window_size_seconds
+        self._window_size_ns = window_size_seconds * 1_000_000_000
         self.max_requests = max_requests or settings.rate_limit_per_minute
-        self._windows: Dict[str, deque] = defaultdict(deque)
-        self._cleanup_threshold = 1000 
+        self.strategy = strategy
+        self._fixed_window = strategy == "fixed"
+        # Per user: (window index, current window count, previous window count)
+        self._shards: List["OrderedDict[str, Tuple[int, int, int]]"] = [
+            OrderedDict() for _ in range(RATE_LIMIT_SHARD_COUNT)
+        ]
+        self._shard_locks = [threading.Lock() for _ in range(RATE_LIMIT_SHARD_COUNT)]
+        # Per shard: (window index, requests admitted in that window), kept for get_stats
+        self._shard_requests: List[Tuple[int, int]] = [(0, 0)] * RATE_LIMIT_SHARD_COUNT
         
         logger.info("Rate limiter initialized", extra={
             "window_size_seconds": window_size_seconds,
-            "max_requests": self.max_requests
+            "max_requests": self.max_requests,
+            "strategy": strategy
         })
     
-    def _cleanup_old_entries(self, user_id: str, current_time: float):
-        """Remove entries older than the window from the user's deque."""
-        window_start = current_time - self.window_size_seconds
-        
-        user_window = self._windows[user_id]
-        while user_window and user_window[0] < window_start:
-            user_window.popleft()
-    
-    def _cleanup_inactive_users(self):
-        """Remove users with empty windows to prevent memory leaks."""
-        if len(self._windows) > self._cleanup_threshold:
-            inactive_users = [
-                user_id for user_id, window in self._windows.items()
-                if not window
-            ]
-            
-            for user_id in inactive_users:
-                del self._windows[user_id]
-            
+    def _shard_index(self, user_id: str) -> int:
+        """Return the index of the state shard that holds this user."""
+        return hash(user_id) & (RATE_LIMIT_SHARD_COUNT - 1)
+    
+    def _shard(self, user_id: str) -> "OrderedDict[str, Tuple[int, int, int]]":
+        """Return the state shard that holds this user."""
+        return self._shards[self._shard_index(user_id)]
+    
+    def _window_position(self) -> Tuple[int, float]:
+        """Current window index and seconds elapsed within it."""
+        # Integer nanoseconds on the monotonic clock: exact window boundaries, and
+        # wall-clock jumps cannot strand a window
+        window_index, elapsed_ns = divmod(time.monotonic_ns(), self._window_size_ns)
+        return window_index, elapsed_ns / 1_000_000_000
+    
+    @staticmethod
+    def _window_counts(state: Optional[Tuple[int, int, int]], window_index: int) -> Tuple[int, int]:
+        """Current and previous window counts as seen from ``window_index``."""
+        if state is None:
+            return 0, 0
+        
+        stored_index, current_count, previous_count = state
+        if stored_index == window_index:
+            return current_count, previous_count
+        if stored_index == window_index - 1:
+            return 0, current_count
+        return 0, 0
+    
+    def _estimate(self, current_count: int, previous_count: int, elapsed: float) -> float:
+        """Weighted request count over the sliding window ending now."""
+        if self._fixed_window:
+            return current_count
+        return previous_count * (1 - elapsed / self.window_size_seconds) + current_count
+    
+    def _seconds_until_allowed(self, current_count: int, previous_count: int, elapsed: float) -> int:
+        """Seconds until the estimate drops below the limit again."""
+        window = self.window_size_seconds
+        if self._fixed_window:
+            return max(1, math.ceil(window - elapsed))
+        if current_count < self.max_requests and previous_count:
+            # The previous window's weight decays within the current window
+            wait = (window - elapsed) - window * (self.max_requests - current_count) / previous_count
+        else:
+            # Wait for the next window, where the current count becomes the decaying one
+            wait = (window - elapsed) + window * max(0.0, 1 - self.max_requests / current_count)
+        # The estimate must drop strictly below the limit, so round past the boundary
+        return max(1, math.floor(wait) + 1)
+    
+    def _seconds_until_clear(self, current_count: int, previous_count: int, elapsed: float) -> int:
+        """Seconds until neither window holds any requests."""
+        if self._fixed_window:
+            return math.ceil(self.window_size_seconds - elapsed) if current_count else 0
+        if current_count:
+            return math.ceil(2 * self.window_size_seconds - elapsed)
+        if previous_count:
+            return math.ceil(self.window_size_seconds - elapsed)
+        return 0
+    
+    def _cleanup_inactive_users(self, shard: "OrderedDict[str, Tuple[int, int, int]]", window_index: int):
+        """Evict least recently seen users once no counted window holds requests."""
+        cleaned_count = 0
+        while shard:
+            oldest_user_id = next(iter(shard))
+            current_count, previous_count = self._window_counts(shard[oldest_user_id], window_index)
+            if current_count or (previous_count and not self._fixed_window):
+                break
+            del shard[oldest_user_id]
+            cleaned_count += 1
+        
+        if cleaned_count and logger.is_enabled_for(logging.DEBUG):
             logger.debug("Cleaned up inactive users", extra={
-                "cleaned_count": len(inactive_users),
-                "remaining_users": len(self._windows)
+                "cleaned_count": cleaned_count,
+                "remaining_users": len(shard)
             })
     
     def check_rate_limit(
@@ -79,7 +206,8 @@ class SlidingWindowRateLimiter:
         
         Args:
             user_id: User identifier
-            correlation_id: Correlation ID for logging
+            correlation_id: Correlation ID for logging; the context one is only
+                looked up (or generated) when an entry is actually logged
             
         Returns:
             Dict with remaining requests and reset time
@@ -87,56 +215,66 @@ class SlidingWindowRateLimiter:
         Raises:
             RateLimitExceeded: If rate limit is exceeded
         """
-        if not correlation_id:
-            correlation_id = generate_correlation_id()
+        max_requests = self.max_requests
+        window_index, elapsed = self._window_position()
+        shard_index = self._shard_index(user_id)
+        shard = self._shards[shard_index]
         
-        current_time = time.time()
-        
-        self._cleanup_old_entries(user_id, current_time)
+        with self._shard_locks[shard_index]:
+            current_count, previous_count = self._window_counts(shard.get(user_id), window_index)
+            estimated = self._estimate(current_count, previous_count, elapsed)
+            admitted = estimated < max_requests
+            if admitted:
+                current_count += 1
+                shard[user_id] = (window_index, current_count, previous_count)
+                shard.move_to_end(user_id)
+                counted_index, counted = self._shard_requests[shard_index]
+                self._shard_requests[shard_index] = (
+                    window_index, counted + 1 if counted_index == window_index else 1
+                )
+                self._cleanup_inactive_users(shard, window_index)
         
-        user_window = self._windows[user_id]
-        current_requests = len(user_window)
-        
-        logger.debug("Rate limit check", extra={
-            "correlation_id": correlation_id,
-            "user_id": user_id,
-            "current_requests": current_requests,
-            "max_requests": self.max_requests,
-            "window_size_seconds": self.window_size_seconds
-        })
+        debug_enabled = logger.is_enabled_for(logging.DEBUG)
+        if debug_enabled:
+            logger.debug("Rate limit check", extra={
+                "correlation_id": correlation_id or get_correlation_id(),
+                "user_id": user_id,
+                "estimated_requests": estimated,
+                "max_requests": max_requests,
+                "window_size_seconds": self.window_size_seconds
+            })
         
-        if current_requests >= self.max_requests:
-            oldest_request_time = user_window[0] if user_window else current_time
-            retry_after = int(oldest_request_time + self.window_size_seconds - current_time)
+        if not admitted:
+            retry_after = self._seconds_until_allowed(current_count, previous_count, elapsed)
             
             logger.warning("Rate limit exceeded", extra={
-                "correlation_id": correlation_id,
+                "correlation_id": correlation_id or get_correlation_id(),
                 "user_id": user_id,
-                "current_requests": current_requests,
-                "max_requests": self.max_requests,
+                "estimated_requests": estimated,
+                "max_requests": max_requests,
                 "retry_after_seconds": retry_after
             })
             
             raise RateLimitExceeded(
-                f"Rate limit exceeded. Maximum {self.max_requests} requests per {self.window_size_seconds} seconds.",
-                retry_after
+                f"Rate limit exceeded. Maximum {max_requests} requests per {self.window_size_seconds} seconds.",
+                retry_after,
+                limit=max_requests,
+                reset_time=int(time.time()) + retry_after
             )
         
-        user_window.append(current_time)
+        remaining_requests = max(0, int(max_requests - estimated - 1))
+        reset_time = int(time.time()) + self._seconds_until_clear(current_count, previous_count, elapsed)
         
-        self._cleanup_inactive_users()
-        
-        remaining_requests = self.max_requests - current_requests - 1
-        reset_time = int(current_time + self.window_size_seconds)
-        
-        logger.debug("Rate limit check passed", extra={
-            "correlation_id": correlation_id,
-            "user_id": user_id,
-            "remaining_requests": remaining_requests,
-            "reset_time": reset_time
-        })
+        if debug_enabled:
+            logger.debug("Rate limit check passed", extra={
+                "correlation_id": correlation_id or get_correlation_id(),
+                "user_id": user_id,
+                "remaining_requests": remaining_requests,
+                "reset_time": reset_time
+            })
         
         return {
+            "limit": max_requests,
             "remaining_requests": remaining_requests,
             "reset_time": reset_time
         }
@@ -151,37 +289,41 @@ class SlidingWindowRateLimiter:
         Returns:
             Dict with current requests, remaining requests, and reset time
         """
-        current_time = time.time()
-        self._cleanup_old_entries(user_id, current_time)
-        
-        user_window = self._windows[user_id]
-        current_requests = len(user_window)
-        remaining_requests = max(0, self.max_requests - current_requests)
-        
-        if user_window:
-            oldest_request_time = user_window[0]
-            reset_time = int(oldest_request_time + self.window_size_seconds)
-        else:
-            reset_time = int(current_time)
+        window_index, elapsed = self._window_position()
+        current_count, previous_count = self._window_counts(self._shard(user_id).get(user_id), window_index)
+        current_requests = math.ceil(self._estimate(current_count, previous_count, elapsed))
         
         return {
             "current_requests": current_requests,
-            "remaining_requests": remaining_requests,
+            "remaining_requests": max(0, self.max_requests - current_requests),
             "max_requests": self.max_requests,
-            "reset_time": reset_time,
+            "reset_time": int(time.time()) + self._seconds_until_clear(current_count, previous_count, elapsed),
             "window_size_seconds": self.window_size_seconds
         }
     
     def reset_user_limit(self, user_id: str):
         """Reset rate limit for a specific user."""
-        if user_id in self._windows:
-            del self._windows[user_id]
-            logger.info("Rate limit reset for user", extra={"user_id": user_id})
+        shard_index = self._shard_index(user_id)
+        shard = self._shards[shard_index]
+        with self._shard_locks[shard_index]:
+            state = shard.pop(user_id, None)
+            if state is None:
+                return
+            counted_index, counted = self._shard_requests[shard_index]
+            if state[0] == counted_index:
+                self._shard_requests[shard_index] = (counted_index, counted - state[1])
+        logger.info("Rate limit reset for user", extra={"user_id": user_id})
     
     def get_stats(self) -> Dict[str, int]:
         """Get rate limiter statistics."""
-        total_users = len(self._windows)
-        total_requests = sum(len(window) for window in self._windows.values())
+        window_index = time.monotonic_ns() // self._window_size_ns
+        total_users = sum(len(shard) for shard in self._shards)
+        # Requests admitted in the current window, from the per-shard running totals
+        total_requests = sum(
+            counted
+            for counted_index, counted in self._shard_requests
+            if counted_index == window_index
+        )
         
         return {
             "total_users": total_users,
@@ -191,6 +333,98 @@ class SlidingWindowRateLimiter:
         }
 
 
+# Sliding log in a sorted set: trim expired entries, count, and admit atomically.
+# Returns {count, 0} when admitted and {count, oldest_ms} when rejected.
+SLIDING_LOG_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[1] - ARGV[2])
+local count = redis.call('ZCARD', KEYS[1])
+if count >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {count, tonumber(oldest[2])}
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return {count + 1, 0}
+"""
+
+
+class RedisRateLimiter:
+    """
+    Sliding log rate limiter shared across workers and hosts through Redis.
+    
+    Each user's admitted requests live in a sorted set scored by time. Trimming,
+    counting and admitting run in one Lua script, so a check is atomic across
+    processes and costs a single round-trip.
+    """
+    
+    def __init__(self, redis_client, key_prefix: str, window_size_seconds: int = 60, max_requests: int = None):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+        self.window_size_seconds = window_size_seconds
+        self.max_requests = max_requests or settings.rate_limit_per_minute
+        self._window_ms = window_size_seconds * 1000
+        self._sliding_log = redis_client.register_script(SLIDING_LOG_LUA)
+        
+        logger.info("Redis rate limiter initialized", extra={
+            "key_prefix": key_prefix,
+            "window_size_seconds": window_size_seconds,
+            "max_requests": self.max_requests
+        })
+    
+    async def check_rate_limit(
+        self,
+        user_id: str,
+        correlation_id: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Check if user has exceeded rate limit.
+        
+        Args:
+            user_id: User identifier
+            correlation_id: Correlation ID for logging; the context one is only
+                looked up (or generated) when an entry is actually logged
+            
+        Returns:
+            Dict with remaining requests and reset time
+            
+        Raises:
+            RateLimitExceeded: If rate limit is exceeded
+        """
+        # Wall clock on purpose: scores must line up across processes
+        current_time = time.time()
+        now_ms = int(current_time * 1000)
+        reset_time = int(current_time) + self.window_size_seconds
+        
+        count, oldest_ms = await self._sliding_log(
+            keys=[f"{self.key_prefix}:{user_id}"],
+            args=[now_ms, self._window_ms, self.max_requests, f"{now_ms}:{secrets.token_hex(4)}"]
+        )
+        
+        if oldest_ms:
+            retry_after = max(1, math.ceil((oldest_ms + self._window_ms - now_ms) / 1000))
+            
+            logger.warning("Rate limit exceeded", extra={
+                "correlation_id": correlation_id or get_correlation_id(),
+                "user_id": user_id,
+                "current_requests": count,
+                "max_requests": self.max_requests,
+                "retry_after_seconds": retry_after
+            })
+            
+            raise RateLimitExceeded(
+                f"Rate limit exceeded. Maximum {self.max_requests} requests per {self.window_size_seconds} seconds.",
+                retry_after,
+                limit=self.max_requests,
+                reset_time=int(current_time) + retry_after
+            )
+        
+        return {
+            "limit": self.max_requests,
+            "remaining_requests": self.max_requests - count,
+            "reset_time": reset_time
+        }
+
+
 class RateLimiterService:
     """Service for managing rate limiting across different endpoints."""
     
@@ -200,24 +434,40 @@ class RateLimiterService:
             max_requests=settings.rate_limit_per_minute
         )
         
+        self.shared_payout_limiter: Optional[RedisRateLimiter] = None
+        if settings.redis_url:
+            if aioredis is None:
+                logger.warning("REDIS_URL is set but the redis package is not installed, using in-memory payout limits")
+            else:
+                self.shared_payout_limiter = RedisRateLimiter(
+                    aioredis.from_url(settings.redis_url),
+                    key_prefix="rl:payout",
+                    window_size_seconds=60,
+                    max_requests=settings.rate_limit_per_minute
+                )
+        
         self.auth_login_limiter = SlidingWindowRateLimiter(
             window_size_seconds=settings.auth_login_window_minutes * 60,
-            max_requests=settings.auth_login_rate_limit
+            max_requests=settings.auth_login_rate_limit,
+            strategy="fixed"
         )
         
         self.auth_callback_limiter = SlidingWindowRateLimiter(
             window_size_seconds=settings.auth_callback_window_minutes * 60,
-            max_requests=settings.auth_callback_rate_limit
+            max_requests=settings.auth_callback_rate_limit,
+            strategy="fixed"
         )
         
         self.token_refresh_limiter = SlidingWindowRateLimiter(
             window_size_seconds=settings.auth_refresh_window_minutes * 60,
-            max_requests=settings.auth_refresh_rate_limit
+            max_requests=settings.auth_refresh_rate_limit,
+            strategy="fixed"
         )
         
         self.auth_general_limiter = SlidingWindowRateLimiter(
             window_size_seconds=settings.auth_general_window_minutes * 60,
-            max_requests=settings.auth_general_rate_limit
+            max_requests=settings.auth_general_rate_limit,
+            strategy="fixed"
         )
         
         logger.info("Rate limiter service initialized", extra={
@@ -228,7 +478,7 @@ class RateLimiterService:
             "auth_general_limit": settings.auth_general_rate_limit
         })
     
-    def check_payout_rate_limit(
+    async def check_payout_rate_limit(
         self,
         user_id: str,
         correlation_id: Optional[str] = None
@@ -236,9 +486,13 @@ class RateLimiterService:
         """
         Check rate limit for payout creation.
         
+        Uses the shared Redis limiter when configured, falling back to the
+        in-memory limiter if Redis is unavailable.
+        
         Args:
             user_id: User identifier
-            correlation_id: Correlation ID for logging
+            correlation_id: Correlation ID for logging; the context one is only
+                looked up (or generated) when an entry is actually logged
             
         Returns:
             Dict with remaining requests and reset time
@@ -246,6 +500,16 @@ class RateLimiterService:
         Raises:
             RateLimitExceeded: If rate limit is exceeded
         """
+        if self.shared_payout_limiter is not None:
+            try:
+                return await self.shared_payout_limiter.check_rate_limit(user_id, correlation_id)
+            except aioredis.RedisError as e:
+                logger.warning("Redis rate limit check failed, using in-memory limiter", extra={
+                    "correlation_id": correlation_id or get_correlation_id(),
+                    "user_id": user_id,
+                    "error": str(e)
+                })
+        
         return self.payout_limiter.check_rate_limit(user_id, correlation_id)
     
     def get_payout_rate_limit_info(self, user_id: str) -> Dict[str, int]:
@@ -266,7 +530,8 @@ class RateLimiterService:
         
         Args:
             user_id: User identifier (IP address for anonymous users)
-            correlation_id: Correlation ID for logging
+            correlation_id: Correlation ID for logging; the context one is only
+                looked up (or generated) when an entry is actually logged
             
         Returns:
             Dict with remaining requests and reset time
@@ -286,7 +551,8 @@ class RateLimiterService:
         
         Args:
             user_id: User identifier (IP address for anonymous users)
-            correlation_id: Correlation ID for logging
+            correlation_id: Correlation ID for logging; the context one is only
+                looked up (or generated) when an entry is actually logged
             
         Returns:
             Dict with remaining requests and reset time
@@ -306,7 +572,8 @@ class RateLimiterService:
         
         Args:
             user_id: User identifier
-            correlation_id: Correlation ID for logging
+            correlation_id: Correlation ID for logging; the context one is only
+                looked up (or generated) when an entry is actually logged
             
         Returns:
             Dict with remaining requests and reset time
@@ -326,7 +593,8 @@ class RateLimiterService:
         
         Args:
             user_id: User identifier
-            correlation_id: Correlation ID for logging
+            correlation_id: Correlation ID for logging; the context one is only
+                looked up (or generated) when an entry is actually logged
             
         Returns:
             Dict with remaining requests and reset time
@@ -354,10 +622,13 @@ class RateLimiterService:
     
     def reset_auth_rate_limits(self, user_id: str):
         """Reset all auth rate limits for a user."""
-        self.auth_login_limiter.reset_user_limit(user_id)
-        self.auth_callback_limiter.reset_user_limit(user_id)
-        self.token_refresh_limiter.reset_user_limit(user_id)
-        self.auth_general_limiter.reset_user_limit(user_id)
+        for limiter in (
+            self.auth_login_limiter,
+            self.auth_callback_limiter,
+            self.token_refresh_limiter,
+            self.auth_general_limiter
+        ):
+            limiter.reset_user_limit(user_id)
         logger.info("All auth rate limits reset for user", extra={"user_id": user_id})
     
     def get_service_stats(self) -> Dict[str, Dict[str, int]]:
@@ -379,32 +650,40 @@ def get_client_identifier(request) -> str:
     Get a unique identifier for rate limiting.
     Uses IP address for anonymous users, user ID for authenticated users.
     """
-    if hasattr(request.state, 'user_id') and request.state.user_id:
-        return str(request.state.user_id)
+    state = request.state
+    user_id = getattr(state, 'user_id', None)
+    if user_id:
+        return str(user_id)
+    
+    # The IP form is cached per request; the user form above wins once auth sets it
+    cached = getattr(state, 'rl_ip_id', None)
+    if cached:
+        return cached
     
     forwarded_for = request.headers.get("X-Forwarded-For")
     if forwarded_for:
-        client_ip = forwarded_for.split(",")[0].strip()
+        client_ip = forwarded_for.partition(",")[0].strip()
     else:
         client_ip = request.client.host if request.client else "unknown"
     
-    return f"ip:{client_ip}"
+    state.rl_ip_id = f"ip:{client_ip}"
+    return state.rl_ip_id
 
 
-def create_rate_limit_exception(retry_after: int, correlation_id: str, limit_type: str = "general") -> HTTPException:
-    """Create a standardized rate limit HTTP exception."""
-    limits = {
-        "login": settings.auth_login_rate_limit,
-        "callback": settings.auth_callback_rate_limit,
-        "refresh": settings.auth_refresh_rate_limit,
-        "general": settings.auth_general_rate_limit,
-        "payout": settings.rate_limit_per_minute
-    }
-    
-    limit = limits.get(limit_type, settings.auth_general_rate_limit)
+def create_rate_limit_exception(
+    retry_after: int,
+    correlation_id: str,
+    limit_type: str = "general",
+    headers: Optional[Dict[str, str]] = None
+) -> HTTPException:
+    """Create a standardized rate limit HTTP exception.
     
+    ``headers`` are the X-RateLimit-* headers from ``RateLimitExceeded.headers``, so the
+    advertised limit and reset always match the limiter that rejected the request.
+    """
     return create_rate_limit_error(
         retry_after=retry_after,
         limit_type=limit_type,
-        correlation_id=correlation_id
+        correlation_id=correlation_id,
+        rate_limit_headers=headers
     )
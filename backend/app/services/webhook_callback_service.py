@@ -8,14 +8,14 @@ import json
 import hmac
 import hashlib
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 import httpx
 from fastapi import HTTPException, status
 
 from ..core.config import settings
-from ..core.logging import get_logger
-from ..core.security import generate_correlation_id
+from ..core.security import sign_webhook_payload_blake2b, webhook_blake2b_key
+from ..core.logging import get_correlation_id, get_logger
 from ..services.mock_payment_provider import mock_payment_provider
 
 logger = get_logger(__name__)
@@ -29,25 +29,29 @@ class WebhookCallbackService:
         # Use 127.0.0.1 instead of localhost to avoid potential DNS issues
         self.webhook_url = f"http://127.0.0.1:8000/webhooks/payments"
         self.webhook_secret = settings.webhook_secret
+        self.signature_type = settings.webhook_signature_type
+        # Keyed once; each signature copies the pre-absorbed key state
+        self._hmac_template = hmac.new(self.webhook_secret.encode(), digestmod=hashlib.sha256)
+        self._blake2b_key = webhook_blake2b_key(self.webhook_secret)
         self.is_registered = False
     
     def generate_webhook_signature(self, payload: str) -> str:
         """
-        Generate HMAC signature for webhook payload.
+        Generate signature for webhook payload using the configured signature type.
         
         Args:
             payload: JSON string payload
             
         Returns:
-            HMAC signature string
+            ``sha256=`` HMAC or ``blake2b=`` keyed hash signature string
         """
-        signature = hmac.new(
-            self.webhook_secret.encode(),
-            payload.encode(),
-            hashlib.sha256
-        ).hexdigest()
+        if self.signature_type == "blake2b":
+            return sign_webhook_payload_blake2b(payload.encode(), self._blake2b_key)
         
-        return f"sha256={signature}"
+        mac = self._hmac_template.copy()
+        mac.update(payload.encode())
+        
+        return f"sha256={mac.hexdigest()}"
     
     async def send_webhook_callback(self, webhook_data: Dict[str, Any]) -> bool:
         """
@@ -59,13 +63,53 @@ class WebhookCallbackService:
         Returns:
             True if successful, False otherwise
         """
+        results = await self.send_webhook_callbacks([webhook_data])
+        return results[0]
+    
+    async def send_webhook_callbacks(self, batch: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Send a batch of webhook callbacks to the webhook service in one database transaction.
+        
+        Each webhook runs in its own SAVEPOINT, so a failure rolls back only that event,
+        and the batch is committed once instead of once per webhook.
+        
+        Args:
+            batch: Webhook data from mock provider
+            
+        Returns:
+            One success flag per webhook, in batch order
+        """
+        # Import webhook service and session factory
+        from ..services.webhook_service import WebhookService
+        from ..db.session import SessionLocal
+        
+        try:
+            async with SessionLocal() as db_session:
+                webhook_service = WebhookService(db_session, commit=False)
+                try:
+                    async with db_session.begin():
+                        results = [
+                            await self._process_webhook_callback(webhook_service, webhook_data)
+                            for webhook_data in batch
+                        ]
+                except Exception:
+                    webhook_service.discard_after_commit()
+                    raise
+                webhook_service.run_after_commit()
+                return results
+        except Exception as e:
+            logger.error("Webhook callback batch failed", extra={
+                "batch_size": len(batch),
+                "error": str(e)
+            })
+            return [False] * len(batch)
+    
+    async def _process_webhook_callback(self, webhook_service, webhook_data: Dict[str, Any]) -> bool:
+        """Process one webhook callback with the batch's webhook service."""
         try:
-            correlation_id = webhook_data.get("correlation_id", generate_correlation_id())
+            correlation_id = webhook_data.get("correlation_id") or get_correlation_id()
             
-            # Import webhook service and schemas
             from ..schemas.webhooks import WebhookRequest, WebhookEventType
-            from ..services.webhook_service import WebhookService
-            from ..db.session import get_db
             
             # Transform webhook data to match WebhookRequest schema
             webhook_request = WebhookRequest(
@@ -74,7 +118,8 @@ class WebhookCallbackService:
                 payment_id=webhook_data["provider_reference"],
                 reference=webhook_data["id"],  # Use payout ID as reference
                 status=webhook_data["status"],
-                timestamp=datetime.fromisoformat(webhook_data["timestamp"].replace('Z', '+00:00')),
+                # The provider sends ISO 8601 with an explicit offset; 3.11 also accepts a "Z" suffix
+                timestamp=datetime.fromisoformat(webhook_data["timestamp"]),
                 metadata={
                     "provider": "mock_payment_provider",
                     "correlation_id": correlation_id
@@ -83,7 +128,7 @@ class WebhookCallbackService:
             
             # Create signature data
             signature_data = {
-                "type": "hmac_sha256",
+                "type": self.signature_type,
                 "verified": True
             }
             
@@ -94,34 +139,28 @@ class WebhookCallbackService:
                 "reference": webhook_data["id"]
             })
             
-            # Get database session and process webhook directly
-            # Use the dependency injection pattern instead of manual session management
-            from ..db.session import SessionLocal
-            
-            async with SessionLocal() as db_session:
-                webhook_service = WebhookService(db_session)
-                
+            async with webhook_service.db.begin_nested():
                 result = await webhook_service.process_webhook_event(
                     webhook_data=webhook_request,
                     signature_data=signature_data,
                     correlation_id=correlation_id
                 )
+            
+            if result.get("processed", False):
+                logger.info("Webhook callback processed successfully", extra={
+                    "correlation_id": correlation_id,
+                    "event_id": webhook_request.event_id,
+                    "payout_id": result.get("payout_id")
+                })
+                return True
+            else:
+                logger.warning("Webhook callback not processed", extra={
+                    "correlation_id": correlation_id,
+                    "event_id": webhook_request.event_id,
+                    "error": result.get("error")
+                })
+                return False
                 
-                if result.get("processed", False):
-                    logger.info("Webhook callback processed successfully", extra={
-                        "correlation_id": correlation_id,
-                        "event_id": webhook_request.event_id,
-                        "payout_id": result.get("payout_id")
-                    })
-                    return True
-                else:
-                    logger.warning("Webhook callback not processed", extra={
-                        "correlation_id": correlation_id,
-                        "event_id": webhook_request.event_id,
-                        "error": result.get("error")
-                    })
-                    return False
-                    
         except Exception as e:
             logger.error("Webhook callback failed", extra={
                 "correlation_id": webhook_data.get("correlation_id"),
@@ -137,35 +176,40 @@ class WebhookCallbackService:
             logger.info("Webhook callback already registered")
             return
         
-        async def webhook_callback(webhook_data: Dict[str, Any]) -> None:
-            """Webhook callback function for mock payment provider."""
+        async def webhook_callback(batch: List[Dict[str, Any]]) -> None:
+            """Batch webhook callback function for mock payment provider."""
             try:
-                logger.info("Mock provider webhook callback triggered", extra={
-                    "payout_id": webhook_data.get("id"),
-                    "status": webhook_data.get("status"),
-                    "provider_reference": webhook_data.get("provider_reference"),
-                    "webhook_data": webhook_data
-                })
-                
-                success = await self.send_webhook_callback(webhook_data)
-                
-                if success:
-                    logger.info("Webhook callback completed successfully", extra={
-                        "payout_id": webhook_data.get("id"),
-                        "status": webhook_data.get("status")
-                    })
-                else:
-                    logger.error("Webhook callback failed", extra={
+                for webhook_data in batch:
+                    logger.info("Mock provider webhook callback triggered", extra={
                         "payout_id": webhook_data.get("id"),
-                        "status": webhook_data.get("status")
+                        "status": webhook_data.get("status"),
+                        "provider_reference": webhook_data.get("provider_reference"),
+                        "webhook_data": webhook_data
                     })
+                
+                results = await self.send_webhook_callbacks(batch)
+                
+                for webhook_data, success in zip(batch, results):
+                    if success:
+                        logger.info("Webhook callback completed successfully", extra={
+                            "payout_id": webhook_data.get("id"),
+                            "status": webhook_data.get("status")
+                        })
+                    else:
+                        logger.error("Webhook callback failed", extra={
+                            "payout_id": webhook_data.get("id"),
+                            "status": webhook_data.get("status")
+                        })
                     
             except Exception as e:
                 logger.error("Webhook callback error", extra={
-                    "payout_id": webhook_data.get("id"),
+                    "batch_size": len(batch),
                     "error": str(e)
                 })
         
+        # One call per provider batch, so the whole batch shares a database session
+        webhook_callback.supports_batch = True
+        
         # Register the callback with mock payment provider
         mock_payment_provider.add_webhook_callback(webhook_callback)
         self.is_registered = True
@@ -2,31 +2,113 @@
 Webhook service for processing payment provider notifications.
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+import logging
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from uuid import UUID, uuid4
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import bindparam, func, select, update
 from fastapi import HTTPException, status
 
 from ..core.logging import get_logger
-from ..core.security import sanitize_log_data
 from ..models.payout import Payout, PayoutStatus
 from ..schemas.webhooks import (
     WebhookRequest,
     WebhookEventType,
     WebhookEvent
 )
+from .payout_service import invalidate_cached_payout
 
 logger = get_logger(__name__)
 
+PAYOUT_ID_BY_REFERENCE_STMT = select(Payout.id).where(Payout.reference == bindparam("reference"))
+# Applies a webhook event in one round-trip; a redelivered event id matches no row.
+# Values are bound per call since which columns change depends on the event. No
+# payout entities are loaded on this path, so the session is not synchronized.
+APPLY_WEBHOOK_EVENT_STMT = (
+    update(Payout)
+    .where(
+        Payout.reference == bindparam("ref"),
+        Payout.last_webhook_event_id.is_distinct_from(bindparam("webhook_event_id"))
+    )
+    .returning(Payout.id, Payout.idempotency_key)
+    .execution_options(synchronize_session=False)
+)
+
+
+APPLIED_EVENT_CACHE_SIZE = 10_000
+APPLIED_EVENT_TTL_SECONDS = 600
+
+# Recently applied (reference, event_id) -> (payout id, expiry on the monotonic clock).
+# Shared across sessions so provider redeliveries skip the database; the conditional
+# UPDATE stays authoritative across workers and after expiry.
+_applied_events: "OrderedDict[Tuple[str, str], Tuple[UUID, float]]" = OrderedDict()
+
+
+def get_applied_event(reference: str, event_id: str) -> Optional[UUID]:
+    """Return the payout id if this event was applied recently, else None."""
+    entry = _applied_events.get((reference, event_id))
+    if entry is None:
+        return None
+    payout_id, expires_at = entry
+    if expires_at <= time.monotonic():
+        del _applied_events[(reference, event_id)]
+        return None
+    return payout_id
+
+
+def remember_applied_event(reference: str, event_id: str, payout_id: UUID) -> None:
+    """Record an applied event, evicting the oldest entries when full or expired."""
+    now = time.monotonic()
+    key = (reference, event_id)
+    _applied_events[key] = (payout_id, now + APPLIED_EVENT_TTL_SECONDS)
+    _applied_events.move_to_end(key)
+    # Every entry gets the same TTL, so insertion order is also expiry order
+    while _applied_events and (
+        len(_applied_events) > APPLIED_EVENT_CACHE_SIZE
+        or next(iter(_applied_events.values()))[1] <= now
+    ):
+        _applied_events.popitem(last=False)
+
+
+@lru_cache(maxsize=1024)
+def parse_correlation_id(correlation_id: str) -> Optional[UUID]:
+    """Parse a correlation ID as a UUID, or None if it is not one; redeliveries reuse the result."""
+    try:
+        return UUID(correlation_id)
+    except ValueError:
+        return None
+
 
 class WebhookService:
     """Service for handling webhook operations."""
     
-    def __init__(self, db: Optional[AsyncSession] = None):
+    def __init__(self, db: AsyncSession, commit: bool = True):
         self.db = db
+        # False when the caller owns the transaction, e.g. a batch of events with a
+        # SAVEPOINT each; cache updates then wait for run_after_commit()
+        self.commit = commit
+        self._pending_after_commit: List[Tuple[Callable[..., None], Tuple[Any, ...]]] = []
+    
+    def _after_commit(self, callback: Callable[..., None], *args: Any) -> None:
+        """Run a process-local cache update once the payout change is committed."""
+        if self.commit:
+            callback(*args)
+        else:
+            self._pending_after_commit.append((callback, args))
+    
+    def run_after_commit(self) -> None:
+        """Apply the cache updates deferred until the caller committed its transaction."""
+        pending, self._pending_after_commit = self._pending_after_commit, []
+        for callback, args in pending:
+            callback(*args)
+    
+    def discard_after_commit(self) -> None:
+        """Drop deferred cache updates when the caller's transaction was rolled back."""
+        self._pending_after_commit.clear()
     
     async def process_webhook_event(
         self,
@@ -45,83 +127,99 @@ class WebhookService:
         - Logs all operations
         """
         try:
-            logger.info("Processing webhook event", extra={
-                "correlation_id": correlation_id,
-                "event_type": webhook_data.event_type,
-                "event_id": webhook_data.event_id,
-                "payment_id": webhook_data.payment_id,
-                "reference": webhook_data.reference,
-                "status": webhook_data.status
-            })
-            
-            if not self.db:
-                # This should not happen as we're passing the session from the callback service
-                logger.error("No database session provided to webhook service", extra={
-                    "correlation_id": correlation_id
-                })
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Database session not available"
-                )
-            
-            payout = await self._find_payout_by_reference(webhook_data.reference)
-            
-            if not payout:
-                logger.warning("Payout not found for webhook", extra={
+            # Success-path detail is DEBUG; one INFO line per applied event is the audit trail
+            debug_enabled = logger.is_enabled_for(logging.DEBUG)
+            if debug_enabled:
+                logger.debug("Processing webhook event", extra={
                     "correlation_id": correlation_id,
+                    "event_type": webhook_data.event_type,
+                    "event_id": webhook_data.event_id,
+                    "payment_id": webhook_data.payment_id,
                     "reference": webhook_data.reference,
-                    "event_id": webhook_data.event_id
+                    "status": webhook_data.status
                 })
-                
-                await self._create_webhook_event_record(
-                    webhook_data=webhook_data,
-                    signature_data=signature_data,
-                    correlation_id=correlation_id,
-                    payout_id=None
-                )
+            
+            payout_id = get_applied_event(webhook_data.reference, webhook_data.event_id)
+            if payout_id is not None:
+                if debug_enabled:
+                    logger.debug("Duplicate webhook ignored", extra={
+                        "correlation_id": correlation_id,
+                        "event_id": webhook_data.event_id,
+                        "payout_id": payout_id,
+                        "source": "applied_event_cache"
+                    })
                 
                 return {
-                    "processed": False,
-                    "error": "Payout not found",
-                    "payout_id": None
+                    "processed": True,
+                    "duplicate": True,
+                    "payout_id": str(payout_id)
                 }
             
-            if await self._is_duplicate_webhook(webhook_data.event_id, payout.id):
+            # Update first: a new event costs one round-trip, and only a miss needs a lookup
+            payout_id = await self._update_payout_from_webhook(
+                webhook_data=webhook_data,
+                correlation_id=correlation_id
+            )
+            
+            if payout_id is None:
+                payout_id = await self._find_payout_id_by_reference(webhook_data.reference)
+                
+                if payout_id is None:
+                    logger.warning("Payout not found for webhook", extra={
+                        "correlation_id": correlation_id,
+                        "reference": webhook_data.reference,
+                        "event_id": webhook_data.event_id
+                    })
+                    
+                    await self._create_webhook_event_record(
+                        webhook_data=webhook_data,
+                        signature_data=signature_data,
+                        correlation_id=correlation_id,
+                        payout_id=None
+                    )
+                    
+                    return {
+                        "processed": False,
+                        "error": "Payout not found",
+                        "payout_id": None
+                    }
+                
+                self._after_commit(
+                    remember_applied_event, webhook_data.reference, webhook_data.event_id, payout_id
+                )
                 logger.info("Duplicate webhook ignored", extra={
                     "correlation_id": correlation_id,
                     "event_id": webhook_data.event_id,
-                    "payout_id": str(payout.id)
+                    "payout_id": payout_id
                 })
                 
                 return {
                     "processed": True,
                     "duplicate": True,
-                    "payout_id": str(payout.id)
+                    "payout_id": str(payout_id)
                 }
             
-            await self._update_payout_from_webhook(
-                payout=payout,
-                webhook_data=webhook_data,
-                correlation_id=correlation_id
+            self._after_commit(
+                remember_applied_event, webhook_data.reference, webhook_data.event_id, payout_id
             )
             
             await self._create_webhook_event_record(
                 webhook_data=webhook_data,
                 signature_data=signature_data,
                 correlation_id=correlation_id,
-                payout_id=payout.id
+                payout_id=payout_id
             )
             
             logger.info("Webhook event processed successfully", extra={
                 "correlation_id": correlation_id,
                 "event_id": webhook_data.event_id,
-                "payout_id": str(payout.id),
+                "payout_id": payout_id,
                 "new_status": webhook_data.status
             })
             
             return {
                 "processed": True,
-                "payout_id": str(payout.id),
+                "payout_id": str(payout_id),
                 "status_updated": True
             }
             
@@ -145,11 +243,10 @@ class WebhookService:
                 detail="Webhook processing failed"
             )
     
-    async def _find_payout_by_reference(self, reference: str) -> Optional[Payout]:
-        """Find payout by reference."""
+    async def _find_payout_id_by_reference(self, reference: str) -> Optional[UUID]:
+        """Find payout id by reference."""
         try:
-            stmt = select(Payout).where(Payout.reference == reference)
-            result = await self.db.execute(stmt)
+            result = await self.db.execute(PAYOUT_ID_BY_REFERENCE_STMT, {"reference": reference})
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error("Failed to find payout by reference", extra={
@@ -158,94 +255,87 @@ class WebhookService:
             })
             return None
     
-    async def _is_duplicate_webhook(self, event_id: str, payout_id: UUID) -> bool:
-        """Check if webhook event is duplicate using existing payout fields."""
-        try:
-            stmt = select(Payout).where(
-                Payout.id == payout_id,
-                Payout.last_webhook_event_id == event_id
-            )
-            result = await self.db.execute(stmt)
-            payout = result.scalar_one_or_none()
-            
-            if payout:
-                logger.info("Duplicate webhook detected", extra={
-                    "event_id": event_id,
-                    "payout_id": str(payout_id),
-                    "existing_status": payout.provider_status,
-                    "webhook_received_at": payout.webhook_received_at.isoformat() if payout.webhook_received_at else None
-                })
-                return True
-            
-            return False
-        except Exception as e:
-            logger.error("Failed to check duplicate webhook", extra={
-                "event_id": event_id,
-                "payout_id": str(payout_id),
-                "error": str(e)
-            })
-            # Fail open for safety - if we can't check, allow processing
-            return False
-    
     async def _update_payout_from_webhook(
         self,
-        payout: Payout,
         webhook_data: WebhookRequest,
         correlation_id: str
-    ) -> None:
-        """Update payout status from webhook data."""
+    ) -> Optional[UUID]:
+        """
+        Apply a webhook event to its payout unless that event was already applied.
+        
+        Returns the payout id, or None when no payout has this reference or the
+        payout's last webhook event is this one.
+        """
         try:
-            status_mapping = {
-                "pending": PayoutStatus.pending,
-                "processing": PayoutStatus.processing,
-                "succeeded": PayoutStatus.succeeded,
-                "failed": PayoutStatus.failed,
-                "cancelled": PayoutStatus.cancelled
-            }
-            
-            new_status = status_mapping.get(webhook_data.status, PayoutStatus.pending)
+            new_status = webhook_data.payout_status
             
-            payout.status = new_status
-            payout.provider_reference = webhook_data.payment_id
-            payout.provider_status = webhook_data.status
-            payout.webhook_received_at = datetime.utcnow()
-            payout.last_webhook_event_id = webhook_data.event_id
             # Only set correlation_id if it's a valid UUID format
-            try:
-                payout.correlation_id = UUID(correlation_id)
-            except ValueError:
+            payout_correlation_id = parse_correlation_id(correlation_id)
+            if payout_correlation_id is None:
                 # If correlation_id is not a valid UUID, generate a new one
-                payout.correlation_id = uuid4()
+                payout_correlation_id = uuid4()
                 logger.warning("Invalid correlation_id format, generated new UUID", extra={
                     "correlation_id": correlation_id,
-                    "payout_id": str(payout.id)
+                    "reference": webhook_data.reference
                 })
             
-            if webhook_data.status == "failed":
-                payout.error_code = webhook_data.error_code
-                payout.error_message = webhook_data.error_message
-            
+            values = {
+                "provider_reference": webhook_data.payment_id,
+                # The provider's own string, kept verbatim for audit
+                "provider_status": webhook_data.status,
+                # Same database clock as updated_at, rather than each worker's own
+                "webhook_received_at": func.now(),
+                "last_webhook_event_id": webhook_data.event_id,
+                "correlation_id": payout_correlation_id
+            }
+            if new_status is None:
+                # Recorded in provider_status, but never guessed into a payout status
+                logger.warning("Unknown provider status, payout status left unchanged", extra={
+                    "correlation_id": correlation_id,
+                    "reference": webhook_data.reference,
+                    "event_id": webhook_data.event_id,
+                    "provider_status": webhook_data.status
+                })
+            else:
+                values["status"] = new_status
+            if new_status is PayoutStatus.failed:
+                values["error_code"] = webhook_data.error_code
+                values["error_message"] = webhook_data.error_message
             if webhook_data.metadata:
-                payout.metadata_json = webhook_data.metadata
+                values["metadata_json"] = webhook_data.metadata
             
-            await self.db.commit()
-            await self.db.refresh(payout)
+            result = await self.db.execute(
+                APPLY_WEBHOOK_EVENT_STMT.values(**values),
+                {"ref": webhook_data.reference, "webhook_event_id": webhook_data.event_id}
+            )
+            updated = result.first()
+            if self.commit:
+                await self.db.commit()
             
-            logger.info("Payout updated from webhook", extra={
-                "correlation_id": correlation_id,
-                "payout_id": str(payout.id),
-                "reference": payout.reference,
-                "old_status": payout.status,
-                "new_status": new_status,
-                "provider_reference": webhook_data.payment_id,
-                "webhook_event_id": webhook_data.event_id
-            })
+            if updated is None:
+                return None
+            
+            self._after_commit(invalidate_cached_payout, updated.idempotency_key)
+            
+            if logger.is_enabled_for(logging.DEBUG):
+                logger.debug("Payout updated from webhook", extra={
+                    "correlation_id": correlation_id,
+                    "payout_id": updated.id,
+                    "reference": webhook_data.reference,
+                    "new_status": new_status,
+                    "provider_reference": webhook_data.payment_id,
+                    "webhook_event_id": webhook_data.event_id
+                })
+            
+            return updated.id
             
         except Exception as e:
-            await self.db.rollback()
+            # A caller-owned transaction rolls back its own SAVEPOINT
+            if self.commit:
+                await self.db.rollback()
             logger.error("Failed to update payout from webhook", extra={
                 "correlation_id": correlation_id,
-                "payout_id": str(payout.id),
+                "reference": webhook_data.reference,
                 "error": str(e)
             })
             raise
@@ -261,15 +351,16 @@ class WebhookService:
         """Create webhook event record for tracking."""
         try:
             # In a real implementation, you'd have a webhook_events table
-            # For now, we'll just log the event
-            logger.info("Webhook event recorded", extra={
-                "correlation_id": correlation_id,
-                "event_id": webhook_data.event_id,
-                "event_type": webhook_data.event_type,
-                "payout_id": str(payout_id) if payout_id else None,
-                "error": error,
-                "signature_type": signature_data.get("type")
-            })
+            # For now, we'll just log the event; outcomes are already logged at INFO+
+            if logger.is_enabled_for(logging.DEBUG):
+                logger.debug("Webhook event recorded", extra={
+                    "correlation_id": correlation_id,
+                    "event_id": webhook_data.event_id,
+                    "event_type": webhook_data.event_type,
+                    "payout_id": payout_id,
+                    "error": error,
+                    "signature_type": signature_data.get("type")
+                })
             
         except Exception as e:
             logger.error("Failed to create webhook event record", extra={
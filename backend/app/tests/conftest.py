@@ -4,12 +4,15 @@ Test configuration and fixtures for all tests.
 
 import os
 import pytest
-import asyncio
+import pytest_asyncio
 from unittest.mock import patch
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.pool import StaticPool
 
-os.environ.update({
+# Set once for the whole run, before any app module reads settings; values already
+# in the environment (e.g. from CI) win
+for _key, _value in {
     "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
     "SECRET_KEY": "test-secret-key-for-testing-minimum-32-characters-long",
     "GOOGLE_CLIENT_ID": "test-client-id.apps.googleusercontent.com",
@@ -24,7 +27,8 @@ os.environ.update({
     "APP_NAME": "Fintech Payouts API Test",
     "DEBUG": "false",
     "LOG_LEVEL": "INFO"
-})
+}.items():
+    os.environ.setdefault(_key, _value)
 
 
 @pytest.fixture(autouse=True)
@@ -48,17 +52,27 @@ def mock_settings():
         yield mock_settings
 
 
-@pytest.fixture(scope="function")
-def event_loop():
-    """Create an instance of the default event loop for the test function."""
-    loop = asyncio.new_event_loop()
-    yield loop
-    loop.close()
+@pytest.fixture(autouse=True)
+def clear_idempotency_cache():
+    """Keep cached idempotent payouts from leaking between tests."""
+    from ..services.payout_service import _idempotency_cache
+    _idempotency_cache.clear()
+    yield
+    _idempotency_cache.clear()
 
 
-@pytest.fixture
+@pytest.fixture(autouse=True)
+def clear_applied_webhook_events():
+    """Keep recently applied webhook events from leaking between tests."""
+    from ..services.webhook_service import _applied_events
+    _applied_events.clear()
+    yield
+    _applied_events.clear()
+
+
+@pytest_asyncio.fixture(scope="session")
 async def test_engine():
-    """Create test database engine."""
+    """Create the test database engine and schema once per test session."""
     engine = create_async_engine(
         "sqlite+aiosqlite:///:memory:",
         poolclass=StaticPool,
@@ -66,6 +80,18 @@ async def test_engine():
         echo=False
     )
     
+    @event.listens_for(engine.sync_engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself, or pysqlite's implicit transactions break SAVEPOINTs
+        dbapi_connection.isolation_level = None
+        # PostgreSQL functions used by the models' CHECK constraints
+        dbapi_connection.create_function("char_length", 1, len)
+        dbapi_connection.create_function("upper", 1, lambda value: value.upper())
+    
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin_sqlite(conn):
+        conn.exec_driver_sql("BEGIN")
+    
     from ..db.session import Base
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -74,16 +100,20 @@ async def test_engine():
     await engine.dispose()
 
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def db_session(test_engine):
-    """Create database session for tests."""
-    async_session = async_sessionmaker(
-        test_engine, class_=AsyncSession, expire_on_commit=False
-    )
-    
-    async with async_session() as session:
-        yield session
-        await session.rollback()
+    """Create database session for tests, rolled back at teardown so the schema is reused."""
+    async with test_engine.connect() as conn:
+        trans = await conn.begin()
+        # Commits inside the test release a SAVEPOINT; the outer transaction is never committed
+        session = AsyncSession(
+            bind=conn, expire_on_commit=False, join_transaction_mode="create_savepoint"
+        )
+        try:
+            yield session
+        finally:
+            await session.close()
+            await trans.rollback()
 
 
 @pytest.fixture
@@ -11,13 +11,13 @@ from ...models.payout import Payout, PayoutStatus
 from ...schemas.webhooks import WebhookRequest, WebhookEventType
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def test_webhook_data() -> WebhookRequest:
-    """Create test webhook data."""
+    """Create test webhook data, shared read-only across the session."""
     return WebhookRequest(
         event_type=WebhookEventType.PAYMENT_SUCCEEDED,
         event_id="evt_test123",
-        timestamp=datetime.utcnow(),
+        timestamp=datetime(2024, 1, 1),
         payment_id="pay_test123",
         reference="PAY_TEST123456789",
         status="succeeded",
@@ -30,10 +30,11 @@ def test_webhook_data() -> WebhookRequest:
 def test_payout_for_webhook() -> Payout:
     """Create a test payout for webhook processing."""
     payout_id = uuid4()
+    user_id = uuid4()
     payout = Payout(
         id=payout_id,
         reference="PAY_TEST123456789",
-        user_id=uuid4(),
+        user_id=user_id,
         amount=Decimal("100.50"),
         currency="USD",
         status=PayoutStatus.pending,
@@ -43,5 +44,5 @@ def test_payout_for_webhook() -> Payout:
         updated_at=datetime.utcnow()
     )
     payout.id = str(payout_id)
-    payout.user_id = str(uuid4())
+    payout.user_id = str(user_id)
     return payout
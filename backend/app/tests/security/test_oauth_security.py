@@ -16,6 +16,22 @@ from ...core.security import (
 )
 
 
+@pytest.fixture(scope="module")
+def oauth_state() -> str:
+    """One signed OAuth state shared by the tests that only validate it."""
+    return generate_oauth_state()
+
+
+@pytest.fixture(scope="module")
+def access_token() -> str:
+    """One signed access token shared by the tests that only verify it."""
+    return create_access_token({
+        "sub": "user123",
+        "email": "test@example.com",
+        "google_id": "google123"
+    })
+
+
 class TestOAuthSecurity:
     """Test OAuth 2.0 security mechanisms."""
     
@@ -37,10 +53,20 @@ class TestOAuthSecurity:
         # Check signature length
         assert len(parts[2]) == 64  
     
-    def test_validate_oauth_state_valid(self):
-        """Test valid OAuth state validation."""
-        state = generate_oauth_state()
-        assert validate_oauth_state(state) is True
+    @pytest.mark.parametrize("mutate, expect_valid", [
+        (lambda state: state, True),
+        (lambda state: "invalid-state", False),
+        (lambda state: ":".join([*state.split(":")[:2], "invalid_signature"]), False),
+    ], ids=["valid", "invalid_format", "invalid_signature"])
+    def test_validate_oauth_state(self, oauth_state: str, mutate, expect_valid: bool):
+        """Test OAuth state validation for valid, malformed and tampered states."""
+        state = mutate(oauth_state)
+        
+        if expect_valid:
+            assert validate_oauth_state(state) is True
+        else:
+            with pytest.raises(OAuthStateError):
+                validate_oauth_state(state)
     
     def test_pkce_code_verifier_generation(self):
         """Test PKCE code verifier and challenge generation."""
@@ -54,21 +80,6 @@ class TestOAuthSecurity:
         assert code_challenge != code_verifier
         assert len(code_challenge) == 43  # SHA256 hash base64 encoded
     
-    def test_validate_oauth_state_invalid_format(self):
-        """Test invalid OAuth state format."""
-        with pytest.raises(OAuthStateError):
-            validate_oauth_state("invalid-state")
-    
-    def test_validate_oauth_state_invalid_signature(self):
-        """Test OAuth state with invalid signature."""
-        state = generate_oauth_state()
-        parts = state.split(':')
-        parts[2] = "invalid_signature"
-        corrupted_state = ':'.join(parts)
-        
-        with pytest.raises(OAuthStateError):
-            validate_oauth_state(corrupted_state)
-    
     def test_generate_code_verifier(self):
         """Test PKCE code verifier generation."""
         verifier = generate_code_verifier()
@@ -109,16 +120,9 @@ class TestJWTSecurity:
         parts = token.split('.')
         assert len(parts) == 3
     
-    def test_verify_access_token_valid(self):
+    def test_verify_access_token_valid(self, access_token: str):
         """Test valid JWT token verification."""
-        data = {
-            "sub": "user123",
-            "email": "test@example.com",
-            "google_id": "google123"
-        }
-        
-        token = create_access_token(data)
-        payload = verify_access_token(token)
+        payload = verify_access_token(access_token)
         
         assert payload["sub"] == "user123"
         assert payload["email"] == "test@example.com"
@@ -153,27 +157,18 @@ class TestSecurityIntegration:
     """Integration tests for security features."""
     
     @pytest.mark.asyncio
-    async def test_oauth_flow_security(self):
+    async def test_oauth_flow_security(self, oauth_state: str):
         """Test complete OAuth flow security."""
-        state = generate_oauth_state()
         code_verifier = generate_code_verifier()
         
-        assert validate_oauth_state(state)
+        assert validate_oauth_state(oauth_state)
         
         code_challenge = generate_code_challenge(code_verifier)
         assert len(code_challenge) == 43
     
-    def test_jwt_flow_security(self):
+    def test_jwt_flow_security(self, access_token: str):
         """Test complete JWT flow security."""
-        user_data = {
-            "sub": "user123",
-            "email": "test@example.com",
-            "google_id": "google123"
-        }
-        
-        token = create_access_token(user_data)
-        
-        payload = verify_access_token(token)
+        payload = verify_access_token(access_token)
         
         assert payload["sub"] == "user123"
         assert payload["email"] == "test@example.com"
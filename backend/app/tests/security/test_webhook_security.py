@@ -12,27 +12,31 @@ import hashlib
 
 from ...core.security import (
     verify_webhook_signature_hmac,
+    verify_webhook_signature_blake2b,
     verify_webhook_signature_jwt,
     verify_webhook_timestamp,
     WebhookVerificationError
 )
 
+# Literal payload and secret, so the reference signature is computed once at import
+_PAYLOAD = b'{"event": "payment.succeeded", "payment_id": "pay_123"}'
+_SECRET = "test-webhook-secret"
+_SIG = "sha256=" + hmac.new(_SECRET.encode(), _PAYLOAD, hashlib.sha256).hexdigest()
+
+# Timestamps read from one clock sample; the future one is far enough ahead to stay
+# in the future for the whole run, and the valid one is only checked within 5 minutes
+_NOW = datetime.utcnow()
+_NOW_TIMESTAMP = str(int(_NOW.timestamp()))
+_OLD_TIMESTAMP = str(int((_NOW - timedelta(minutes=10)).timestamp()))
+_FUTURE_TIMESTAMP = str(int((_NOW + timedelta(hours=1)).timestamp()))
+
 
 class TestWebhookSecurity:
     """Test webhook security mechanisms - REQUIRED MINIMAL TESTS."""
     
     def test_verify_webhook_signature_hmac_valid(self):
         """Test valid HMAC signature verification - REQUIRED TEST."""
-        payload = b'{"event": "payment.succeeded", "payment_id": "pay_123"}'
-        secret = "test-webhook-secret"
-        
-        signature = hmac.new(
-            secret.encode(),
-            payload,
-            hashlib.sha256
-        ).hexdigest()
-        
-        assert verify_webhook_signature_hmac(payload, f"sha256={signature}", secret)
+        assert verify_webhook_signature_hmac(_PAYLOAD, _SIG, _SECRET)
     
     def test_verify_webhook_signature_hmac_invalid(self):
         """Test invalid HMAC signature verification."""
@@ -42,13 +46,26 @@ class TestWebhookSecurity:
         
         assert not verify_webhook_signature_hmac(payload, f"sha256={invalid_signature}", secret)
     
+    def test_verify_webhook_signature_blake2b(self):
+        """Test keyed BLAKE2b signature verification, including secrets over 64 bytes."""
+        payload = b'{"event": "payment.succeeded", "payment_id": "pay_123"}'
+        
+        for secret in ("test-webhook-secret", "s" * 100):
+            key = secret.encode()
+            if len(key) > 64:
+                key = hashlib.blake2b(key).digest()
+            signature = hashlib.blake2b(payload, key=key, digest_size=32).hexdigest()
+            
+            assert verify_webhook_signature_blake2b(payload, f"blake2b={signature}", secret)
+            assert not verify_webhook_signature_blake2b(payload + b" ", f"blake2b={signature}", secret)
+    
     def test_verify_webhook_signature_jwt_valid(self):
         """Test valid JWT signature verification."""
         from jose import jwt
         
         payload = {
             "event": "payment.succeeded",
-            "exp": int((datetime.utcnow() + timedelta(minutes=5)).timestamp())
+            "exp": int((_NOW + timedelta(minutes=5)).timestamp())
         }
         
         secret = "test-webhook-secret"
@@ -63,7 +80,7 @@ class TestWebhookSecurity:
         
         payload = {
             "event": "payment.succeeded",
-            "exp": int((datetime.utcnow() - timedelta(minutes=1)).timestamp())
+            "exp": int((_NOW - timedelta(minutes=1)).timestamp())
         }
         
         secret = "test-webhook-secret"
@@ -74,18 +91,15 @@ class TestWebhookSecurity:
     
     def test_verify_webhook_timestamp_valid(self):
         """Test valid webhook timestamp - REQUIRED TEST."""
-        timestamp = str(int(datetime.utcnow().timestamp()))
-        assert verify_webhook_timestamp(timestamp)
+        assert verify_webhook_timestamp(_NOW_TIMESTAMP)
     
     def test_verify_webhook_timestamp_too_old(self):
         """Test webhook timestamp that's too old - REQUIRED TEST."""
-        old_timestamp = str(int((datetime.utcnow() - timedelta(minutes=10)).timestamp()))
-        assert not verify_webhook_timestamp(old_timestamp, max_age_seconds=300)
+        assert not verify_webhook_timestamp(_OLD_TIMESTAMP, max_age_seconds=300)
     
     def test_verify_webhook_timestamp_future(self):
         """Test webhook timestamp in the future."""
-        future_timestamp = str(int((datetime.utcnow() + timedelta(minutes=1)).timestamp()))
-        assert not verify_webhook_timestamp(future_timestamp)
+        assert not verify_webhook_timestamp(_FUTURE_TIMESTAMP)
     
     def test_verify_webhook_timestamp_invalid_format(self):
         """Test invalid webhook timestamp format."""
@@ -93,22 +107,11 @@ class TestWebhookSecurity:
     
     def test_webhook_security_integration(self):
         """Test complete webhook security flow - REQUIRED INTEGRATION TEST."""
-        payload = b'{"event": "payment.succeeded", "payment_id": "pay_123"}'
-        secret = "webhook-secret"
-        
         # Test signature verification
-        signature = hmac.new(
-            secret.encode(),
-            payload,
-            hashlib.sha256
-        ).hexdigest()
-        
-        assert verify_webhook_signature_hmac(payload, f"sha256={signature}", secret)
+        assert verify_webhook_signature_hmac(_PAYLOAD, _SIG, _SECRET)
         
         # Test timestamp verification
-        timestamp = str(int(datetime.utcnow().timestamp()))
-        assert verify_webhook_timestamp(timestamp)
+        assert verify_webhook_timestamp(_NOW_TIMESTAMP)
         
         # Test old timestamp rejection
-        old_timestamp = str(int((datetime.utcnow() - timedelta(minutes=10)).timestamp()))
-        assert not verify_webhook_timestamp(old_timestamp, max_age_seconds=300)
+        assert not verify_webhook_timestamp(_OLD_TIMESTAMP, max_age_seconds=300)
@@ -7,31 +7,35 @@ import pytest
 import asyncio
 import sys
 import os
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+from email.utils import format_datetime
 from uuid import uuid4
 
-os.environ.update({
-    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
-    "SECRET_KEY": "test-secret-key-for-testing-minimum-32-characters-long",
-    "GOOGLE_CLIENT_ID": "test-client-id.apps.googleusercontent.com",
-    "GOOGLE_CLIENT_SECRET": "test-client-secret",
-    "WEBHOOK_SECRET": "test-webhook-secret-for-testing-minimum-32-characters",
-    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
-    "WEBHOOK_TIMEOUT_SECONDS": "300",
-    "RATE_LIMIT_PER_MINUTE": "10",
-    "PAYMENT_PROVIDER_BASE_URL": "http://localhost:8000/mock-provider",
-    "PAYMENT_PROVIDER_TIMEOUT": "30",
-    "CORS_ALLOW_ORIGINS": '["http://localhost:3000"]',
-    "APP_NAME": "Fintech Payouts API Test",
-    "DEBUG": "false",
-    "LOG_LEVEL": "INFO"
-})
+if __name__ == "__main__":
+    # Standalone runs skip conftest.py, which sets these under pytest
+    os.environ.update({
+        "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
+        "SECRET_KEY": "test-secret-key-for-testing-minimum-32-characters-long",
+        "GOOGLE_CLIENT_ID": "test-client-id.apps.googleusercontent.com",
+        "GOOGLE_CLIENT_SECRET": "test-client-secret",
+        "WEBHOOK_SECRET": "test-webhook-secret-for-testing-minimum-32-characters",
+        "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+        "WEBHOOK_TIMEOUT_SECONDS": "300",
+        "RATE_LIMIT_PER_MINUTE": "10",
+        "PAYMENT_PROVIDER_BASE_URL": "http://localhost:8000/mock-provider",
+        "PAYMENT_PROVIDER_TIMEOUT": "30",
+        "CORS_ALLOW_ORIGINS": '["http://localhost:3000"]',
+        "APP_NAME": "Fintech Payouts API Test",
+        "DEBUG": "false",
+        "LOG_LEVEL": "INFO"
+    })
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
 from app.services.rate_limiter import SlidingWindowRateLimiter, RateLimitExceeded
 from app.services.mock_payment_provider import MockPaymentProvider, MockErrorType
-from app.utils.retry import retry_async, RetryConfig, RetryError
+from app.utils.retry import retry_async, RetryConfig, RetryError, calculate_delay, get_retry_after
 from app.core.security import generate_correlation_id
 from fastapi import HTTPException
 
@@ -54,11 +58,39 @@ async def test_rate_limiter():
         return False
     except RateLimitExceeded as e:
         print(f"  ✅ Rate limit exceeded as expected: {e.retry_after}s")
+        assert e.headers["X-RateLimit-Limit"] == "3"
+        assert e.headers["X-RateLimit-Remaining"] == "0"
+    
+    # Looking up an unknown user must not allocate state for it
+    info = limiter.get_rate_limit_info("unknown_user")
+    assert info["remaining_requests"] == 3
+    assert limiter.get_stats()["total_users"] == 1
+    print("  ✅ Info lookups do not track new users")
     
     print("  ✅ Rate limiter tests passed!\n")
     return True
 
 
+@pytest.mark.asyncio
+async def test_fixed_window_rate_limiter():
+    """Test the fixed window strategy used by the auth limiters."""
+    limiter = SlidingWindowRateLimiter(window_size_seconds=60, max_requests=2, strategy="fixed")
+    user_id = "test_user"
+    
+    for _ in range(2):
+        limiter.check_rate_limit(user_id)
+    
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.check_rate_limit(user_id)
+    assert 1 <= exc_info.value.retry_after <= 60
+    
+    with pytest.raises(ValueError):
+        SlidingWindowRateLimiter(strategy="unknown")
+    
+    # Counted by main() when run as a script
+    return True
+
+
 @pytest.mark.asyncio
 async def test_mock_payment_provider():
     """Test mock payment provider functionality."""
@@ -75,6 +107,7 @@ async def test_mock_payment_provider():
     })
     
     payout_id = str(uuid4())
+    provider.set_processing_delay(payout_id, 0)
     correlation_id = generate_correlation_id()
     
     try:
@@ -103,6 +136,10 @@ async def test_retry_logic():
     """Test retry logic functionality."""
     print("🧪 Testing Retry Logic...")
     
+    # No backoff: this checks retry counting, not delays (see test_retry_delay_calculation)
+    def fast_config(max_retries: int) -> RetryConfig:
+        return RetryConfig(max_retries=max_retries, base_delay=0, max_delay=0, jitter=False)
+    
     call_count = 0
     
     async def success_func():
@@ -110,7 +147,7 @@ async def test_retry_logic():
         call_count += 1
         return "success"
     
-    result = await retry_async(success_func, config=RetryConfig(max_retries=3))
+    result = await retry_async(success_func, config=fast_config(3))
     print(f"  ✅ Success function: {result} (calls: {call_count})")
     
     call_count = 0
@@ -122,7 +159,7 @@ async def test_retry_logic():
             raise HTTPException(status_code=500, detail="Internal error")
         return "success"
     
-    result = await retry_async(retry_func, config=RetryConfig(max_retries=3))
+    result = await retry_async(retry_func, config=fast_config(3))
     print(f"  ✅ Retry function: {result} (calls: {call_count})")
     
     call_count = 0
@@ -133,7 +170,7 @@ async def test_retry_logic():
         raise HTTPException(status_code=500, detail="Internal error")
     
     try:
-        await retry_async(fail_func, config=RetryConfig(max_retries=2))
+        await retry_async(fail_func, config=fast_config(2))
         print("  ❌ Should have failed!")
         return False
     except RetryError as e:
@@ -143,6 +180,41 @@ async def test_retry_logic():
     return True
 
 
+@pytest.mark.asyncio
+async def test_retry_delay_calculation():
+    """Test full jitter bounds and Retry-After handling."""
+    print("🧪 Testing Retry Delays...")
+    
+    config = RetryConfig(base_delay=1.0, max_delay=30.0, full_jitter=True)
+    for attempt in range(6):
+        delay = calculate_delay(attempt, config)
+        assert 0 <= delay <= min(30.0, 2.0 ** attempt)
+    print("  ✅ Full jitter delays stay within [0, backoff]")
+    
+    error = HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": "5"})
+    retry_after = get_retry_after(error)
+    assert retry_after == 5.0
+    assert calculate_delay(0, config, retry_after) >= 5.0
+    assert get_retry_after(HTTPException(status_code=500, detail="Internal error")) is None
+    print("  ✅ Retry-After is used as a floor for the delay")
+    
+    huge = HTTPException(status_code=429, detail="Too many requests", headers={"Retry-After": "86400"})
+    assert calculate_delay(0, config, get_retry_after(huge)) <= config.max_delay
+    print("  ✅ Retry-After is capped at max_delay")
+    
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    naive_date = format_datetime(retry_at.replace(tzinfo=None))  # "... -0000"
+    assert naive_date.endswith("-0000")
+    dated = HTTPException(status_code=503, detail="Unavailable", headers={"Retry-After": naive_date})
+    assert 0 < get_retry_after(dated) <= 30
+    garbage = HTTPException(status_code=503, detail="Unavailable", headers={"Retry-After": "soon"})
+    assert get_retry_after(garbage) is None
+    print("  ✅ HTTP-date Retry-After values without a zone are read as UTC")
+    
+    print("  ✅ Retry delay tests passed!\n")
+    return True
+
+
 @pytest.mark.asyncio
 async def test_error_simulation():
     """Test error simulation in mock provider."""
@@ -159,6 +231,7 @@ async def test_error_simulation():
     })
     
     payout_id = str(uuid4())
+    provider.set_processing_delay(payout_id, 0)
     correlation_id = generate_correlation_id()
     
     try:
@@ -184,8 +257,10 @@ async def main():
     
     tests = [
         test_rate_limiter,
+        test_fixed_window_rate_limiter,
         test_mock_payment_provider,
         test_retry_logic,
+        test_retry_delay_calculation,
         test_error_simulation,
     ]
     
@@ -4,29 +4,10 @@ Tests payout creation, processing, and webhook handling without full FastAPI app
 """
 
 import pytest
-import os
 from decimal import Decimal
 from uuid import uuid4
 from unittest.mock import AsyncMock, patch
 
-# Set up environment variables before any imports
-os.environ.update({
-    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
-    "SECRET_KEY": "test-secret-key-for-testing-minimum-32-characters-long",
-    "GOOGLE_CLIENT_ID": "test-client-id.apps.googleusercontent.com",
-    "GOOGLE_CLIENT_SECRET": "test-client-secret",
-    "WEBHOOK_SECRET": "test-webhook-secret-for-testing-minimum-32-characters",
-    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
-    "WEBHOOK_TIMEOUT_SECONDS": "300",
-    "RATE_LIMIT_PER_MINUTE": "10",
-    "PAYMENT_PROVIDER_BASE_URL": "http://localhost:8000/mock-provider",
-    "PAYMENT_PROVIDER_TIMEOUT": "30",
-    "CORS_ALLOW_ORIGINS": '["http://localhost:3000"]',
-    "APP_NAME": "Fintech Payouts API Test",
-    "DEBUG": "false",
-    "LOG_LEVEL": "INFO"
-})
-
 from ..models.user import User
 from ..models.payout import Payout, PayoutStatus
 from ..schemas.payouts import PayoutCreate, PayoutRead, PayoutList
@@ -142,13 +123,15 @@ class TestPayoutService:
         with patch("app.services.payout_service.rate_limiter_service.check_payout_rate_limit") as mock_rate_limit:
             mock_rate_limit.side_effect = RateLimitExceeded(message="Rate limit exceeded", retry_after=60)
             
-            with pytest.raises(Exception):  # Should raise rate limit exception
-                await payout_service.create_payout(
-                    payout_data=test_payout_data,
-                    user=test_user,
-                    idempotency_key="test_idempotency_key",
-                    correlation_id="test_correlation_id"
-                )
+            # The idempotency lookup runs alongside the rate limit check
+            with patch.object(payout_service, '_get_payout_by_idempotency_key', return_value=None):
+                with pytest.raises(Exception):  # Should raise rate limit exception
+                    await payout_service.create_payout(
+                        payout_data=test_payout_data,
+                        user=test_user,
+                        idempotency_key="test_idempotency_key",
+                        correlation_id="test_correlation_id"
+                    )
     
     @pytest.mark.asyncio
     async def test_create_payout_idempotency(
@@ -279,20 +262,18 @@ class TestPayoutService:
         )
         
         # Mock the webhook service methods directly
-        with patch.object(webhook_service, '_find_payout_by_reference', return_value=mock_payout) as mock_find:
-            with patch.object(webhook_service, '_is_duplicate_webhook', return_value=False) as mock_duplicate:
-                with patch.object(webhook_service, '_update_payout_from_webhook') as mock_update:
-                    with patch.object(webhook_service, '_create_webhook_event_record') as mock_record:
-                        signature_data = {"type": "hmac_sha256", "verified": True}
-                        
-                        result = await webhook_service.process_webhook_event(
-                            webhook_data=webhook_data,
-                            signature_data=signature_data,
-                            correlation_id="test_correlation_id"
-                        )
-                        
-                        assert result["processed"] is True
-                        assert "payout_id" in result
+        with patch.object(webhook_service, '_update_payout_from_webhook', return_value=mock_payout.id) as mock_update:
+            with patch.object(webhook_service, '_create_webhook_event_record') as mock_record:
+                signature_data = {"type": "hmac_sha256", "verified": True}
+                
+                result = await webhook_service.process_webhook_event(
+                    webhook_data=webhook_data,
+                    signature_data=signature_data,
+                    correlation_id="test_correlation_id"
+                )
+                
+                assert result["processed"] is True
+                assert "payout_id" in result
     
 
 
@@ -0,0 +1,38 @@
+"""
+Unit tests for log redaction.
+"""
+
+from ...core.logging import truncate_sensitive_values
+
+
+class TestTruncateSensitiveValues:
+    """Test the processor that shortens OAuth secrets before rendering."""
+
+    def test_truncates_keyword_and_extra_values(self):
+        """Test that OAuth keys are shortened both at the top level and inside extra."""
+        extra = {"oauth_nonce": "nonce-0123456789", "id_token_nonce": "token-0123456789"}
+        event_dict = {
+            "event": "Nonce mismatch in ID token",
+            "oauth_state": "state-0123456789",
+            "extra": extra
+        }
+
+        result = truncate_sensitive_values(None, "warning", event_dict)
+
+        assert result["oauth_state"] == "state-01..."
+        assert result["extra"] == {"oauth_nonce": "nonce-01...", "id_token_nonce": "token-01..."}
+        # The caller's dict is not modified
+        assert extra["oauth_nonce"] == "nonce-0123456789"
+
+    def test_leaves_unrelated_keys_alone(self):
+        """Test that generic keys such as code or state are not truncated."""
+        event_dict = {
+            "event": "Payout failed",
+            "code": "INSUFFICIENT_FUNDS",
+            "extra": {"state": "pending", "error_code": "PROVIDER_TIMEOUT"}
+        }
+
+        result = truncate_sensitive_values(None, "info", event_dict)
+
+        assert result["code"] == "INSUFFICIENT_FUNDS"
+        assert result["extra"] == {"state": "pending", "error_code": "PROVIDER_TIMEOUT"}
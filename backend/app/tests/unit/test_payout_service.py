@@ -5,29 +5,10 @@ Tests the required minimal test scenario:
 """
 
 import pytest
-import os
 from decimal import Decimal
 from uuid import uuid4
 from unittest.mock import AsyncMock, patch
 
-# Set up environment variables before any imports
-os.environ.update({
-    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
-    "SECRET_KEY": "test-secret-key-for-testing-minimum-32-characters-long",
-    "GOOGLE_CLIENT_ID": "test-client-id.apps.googleusercontent.com",
-    "GOOGLE_CLIENT_SECRET": "test-client-secret",
-    "WEBHOOK_SECRET": "test-webhook-secret-for-testing-minimum-32-characters",
-    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
-    "WEBHOOK_TIMEOUT_SECONDS": "300",
-    "RATE_LIMIT_PER_MINUTE": "10",
-    "PAYMENT_PROVIDER_BASE_URL": "http://localhost:8000/mock-provider",
-    "PAYMENT_PROVIDER_TIMEOUT": "30",
-    "CORS_ALLOW_ORIGINS": '["http://localhost:3000"]',
-    "APP_NAME": "Fintech Payouts API Test",
-    "DEBUG": "false",
-    "LOG_LEVEL": "INFO"
-})
-
 from ...models.user import User
 from ...models.payout import Payout, PayoutStatus
 from ...schemas.payouts import PayoutCreate, PayoutRead, PayoutList
@@ -141,13 +122,15 @@ class TestPayoutService:
         with patch("app.services.payout_service.rate_limiter_service.check_payout_rate_limit") as mock_rate_limit:
             mock_rate_limit.side_effect = RateLimitExceeded(message="Rate limit exceeded", retry_after=60)
             
-            with pytest.raises(Exception):  # Should raise rate limit exception
-                await payout_service.create_payout(
-                    payout_data=test_payout_data,
-                    user=test_user,
-                    idempotency_key="test_idempotency_key",
-                    correlation_id="test_correlation_id"
-                )
+            # The idempotency lookup runs alongside the rate limit check
+            with patch.object(payout_service, '_get_payout_by_idempotency_key', return_value=None):
+                with pytest.raises(Exception):  # Should raise rate limit exception
+                    await payout_service.create_payout(
+                        payout_data=test_payout_data,
+                        user=test_user,
+                        idempotency_key="test_idempotency_key",
+                        correlation_id="test_correlation_id"
+                    )
     
     @pytest.mark.asyncio
     async def test_create_payout_idempotency(
@@ -194,7 +177,50 @@ class TestPayoutService:
                 # Should return the existing payout - REQUIRED ASSERTION
                 assert result.id == str(existing_payout.id)
                 assert result.reference == "PAY_EXISTING123"
-    
+
+    @pytest.mark.asyncio
+    async def test_create_payout_idempotency_served_from_cache_when_settled(
+        self,
+        test_user: User,
+        test_payout_data: PayoutCreate,
+        mock_db_session
+    ):
+        """Test that retries of a settled payout skip the database lookup."""
+        payout_service = PayoutService(mock_db_session)
+
+        from datetime import datetime
+        payout_id = uuid4()
+        existing_payout = Payout(
+            id=payout_id,
+            reference="PAY_SETTLED123",
+            user_id=test_user.id,
+            amount=test_payout_data.amount,
+            currency=test_payout_data.currency,
+            status=PayoutStatus.succeeded,
+            idempotency_key="settled_idempotency_key",
+            retry_count=0,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow()
+        )
+        existing_payout.id = str(payout_id)
+        existing_payout.user_id = str(test_user.id)
+
+        with patch.object(payout_service, '_get_payout_by_idempotency_key', return_value=existing_payout) as mock_idempotency:
+            with patch("app.services.payout_service.rate_limiter_service.check_payout_rate_limit") as mock_rate_limit:
+                mock_rate_limit.return_value = {"remaining_requests": 5}
+
+                for _ in range(2):
+                    result = await payout_service.create_payout(
+                        payout_data=test_payout_data,
+                        user=test_user,
+                        idempotency_key="settled_idempotency_key",
+                        correlation_id="test_correlation_id"
+                    )
+                    assert result.reference == "PAY_SETTLED123"
+
+                assert mock_idempotency.call_count == 1
+                assert mock_rate_limit.call_count == 2
+
     @pytest.mark.asyncio
     async def test_list_payouts_success(
         self,
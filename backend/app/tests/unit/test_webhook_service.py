@@ -3,30 +3,11 @@ Unit tests for webhook service business logic.
 """
 
 import pytest
-import os
 from decimal import Decimal
 from uuid import uuid4
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import datetime
 
-# Set up environment variables before any imports
-os.environ.update({
-    "DATABASE_URL": "sqlite+aiosqlite:///:memory:",
-    "SECRET_KEY": "test-secret-key-for-testing-minimum-32-characters-long",
-    "GOOGLE_CLIENT_ID": "test-client-id.apps.googleusercontent.com",
-    "GOOGLE_CLIENT_SECRET": "test-client-secret",
-    "WEBHOOK_SECRET": "test-webhook-secret-for-testing-minimum-32-characters",
-    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
-    "WEBHOOK_TIMEOUT_SECONDS": "300",
-    "RATE_LIMIT_PER_MINUTE": "10",
-    "PAYMENT_PROVIDER_BASE_URL": "http://localhost:8000/mock-provider",
-    "PAYMENT_PROVIDER_TIMEOUT": "30",
-    "CORS_ALLOW_ORIGINS": '["http://localhost:3000"]',
-    "APP_NAME": "Fintech Payouts API Test",
-    "DEBUG": "false",
-    "LOG_LEVEL": "INFO"
-})
-
 from ...models.payout import Payout, PayoutStatus
 from ...schemas.webhooks import WebhookRequest, WebhookEventType
 from ...services.webhook_service import WebhookService
@@ -79,20 +60,18 @@ class TestWebhookService:
         webhook_service = WebhookService(mock_db_session)
         
         # Mock the webhook service methods directly
-        with patch.object(webhook_service, '_find_payout_by_reference', return_value=test_payout) as mock_find:
-            with patch.object(webhook_service, '_is_duplicate_webhook', return_value=False) as mock_duplicate:
-                with patch.object(webhook_service, '_update_payout_from_webhook') as mock_update:
-                    with patch.object(webhook_service, '_create_webhook_event_record') as mock_record:
-                        signature_data = {"type": "hmac_sha256", "verified": True}
-                        
-                        result = await webhook_service.process_webhook_event(
-                            webhook_data=test_webhook_data,
-                            signature_data=signature_data,
-                            correlation_id="test_correlation_id"
-                        )
-                        
-                        assert result["processed"] is True
-                        assert "payout_id" in result
+        with patch.object(webhook_service, '_update_payout_from_webhook', return_value=test_payout.id) as mock_update:
+            with patch.object(webhook_service, '_create_webhook_event_record') as mock_record:
+                signature_data = {"type": "hmac_sha256", "verified": True}
+                
+                result = await webhook_service.process_webhook_event(
+                    webhook_data=test_webhook_data,
+                    signature_data=signature_data,
+                    correlation_id="test_correlation_id"
+                )
+                
+                assert result["processed"] is True
+                assert result["payout_id"] == str(test_payout.id)
     
     @pytest.mark.asyncio
     async def test_webhook_service_duplicate_detection(
@@ -104,9 +83,9 @@ class TestWebhookService:
         """Test webhook duplicate detection."""
         webhook_service = WebhookService(mock_db_session)
         
-        # Mock duplicate webhook
-        with patch.object(webhook_service, '_find_payout_by_reference', return_value=test_payout) as mock_find:
-            with patch.object(webhook_service, '_is_duplicate_webhook', return_value=True) as mock_duplicate:
+        # A repeated event id matches no row, but the payout exists
+        with patch.object(webhook_service, '_update_payout_from_webhook', return_value=None) as mock_update:
+            with patch.object(webhook_service, '_find_payout_id_by_reference', return_value=test_payout.id) as mock_find:
                 signature_data = {"type": "hmac_sha256", "verified": True}
                 
                 result = await webhook_service.process_webhook_event(
@@ -129,30 +108,99 @@ class TestWebhookService:
     ):
         """Test webhook idempotency using existing payout fields."""
         webhook_service = WebhookService(mock_db_session)
+        correlation_id = "550e8400-e29b-41d4-a716-446655440000"  # Valid UUID format
         
-        # Mock payout that already has the same webhook event_id
-        test_payout.last_webhook_event_id = test_webhook_data.event_id
-        test_payout.webhook_received_at = datetime.utcnow()
-        test_payout.provider_status = test_webhook_data.status
-        
-        with patch.object(webhook_service, '_find_payout_by_reference', return_value=test_payout):
-            with patch.object(webhook_service, '_is_duplicate_webhook', return_value=True) as mock_duplicate:
+        # Payout already carries this event_id, so the conditional update matches nothing
+        with patch.object(webhook_service, '_update_payout_from_webhook', return_value=None) as mock_update:
+            with patch.object(webhook_service, '_find_payout_id_by_reference', return_value=test_payout.id) as mock_find:
                 signature_data = {"type": "hmac_sha256", "verified": True}
                 
                 result = await webhook_service.process_webhook_event(
                     webhook_data=test_webhook_data,
                     signature_data=signature_data,
-                    correlation_id="550e8400-e29b-41d4-a716-446655440000"  # Valid UUID format
+                    correlation_id=correlation_id
                 )
                 
                 # Should detect duplicate and return early
                 assert result["processed"] is True
                 assert result["duplicate"] is True
-                assert "payout_id" in result
+                assert result["payout_id"] == str(test_payout.id)
                 
-                # Verify duplicate check was called
-                mock_duplicate.assert_called_once_with(test_webhook_data.event_id, test_payout.id)
+                # Verify the update was attempted once and the miss was disambiguated by reference
+                mock_update.assert_called_once_with(
+                    webhook_data=test_webhook_data,
+                    correlation_id=correlation_id
+                )
+                mock_find.assert_called_once_with(test_webhook_data.reference)
     
+    @pytest.mark.asyncio
+    async def test_webhook_redelivery_served_from_applied_event_cache(
+        self,
+        mock_db_session,
+        test_webhook_data: WebhookRequest,
+        test_payout: Payout
+    ):
+        """Test that a redelivered event is recognised without touching the database."""
+        webhook_service = WebhookService(mock_db_session)
+        
+        with patch.object(webhook_service, '_update_payout_from_webhook', return_value=test_payout.id) as mock_update:
+            with patch.object(webhook_service, '_find_payout_id_by_reference') as mock_find:
+                signature_data = {"type": "hmac_sha256", "verified": True}
+                
+                first = await webhook_service.process_webhook_event(
+                    webhook_data=test_webhook_data,
+                    signature_data=signature_data,
+                    correlation_id="test_correlation_id"
+                )
+                second = await webhook_service.process_webhook_event(
+                    webhook_data=test_webhook_data,
+                    signature_data=signature_data,
+                    correlation_id="test_correlation_id"
+                )
+                
+                assert first.get("duplicate", False) is False
+                assert second["duplicate"] is True
+                assert second["payout_id"] == str(test_payout.id)
+                mock_update.assert_called_once()
+                mock_find.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_webhook_in_caller_transaction_defers_commit_and_cache(
+        self,
+        mock_db_session,
+        test_webhook_data: WebhookRequest,
+        test_payout: Payout
+    ):
+        """Test that a caller-owned transaction is not committed and caching waits for it."""
+        webhook_service = WebhookService(mock_db_session, commit=False)
+
+        with patch.object(webhook_service, '_update_payout_from_webhook', return_value=test_payout.id) as mock_update:
+            signature_data = {"type": "hmac_sha256", "verified": True}
+
+            await webhook_service.process_webhook_event(
+                webhook_data=test_webhook_data,
+                signature_data=signature_data,
+                correlation_id="test_correlation_id"
+            )
+            await webhook_service.process_webhook_event(
+                webhook_data=test_webhook_data,
+                signature_data=signature_data,
+                correlation_id="test_correlation_id"
+            )
+            # Not cached until the caller's transaction commits
+            assert mock_update.call_count == 2
+            mock_db_session.commit.assert_not_called()
+
+            webhook_service.run_after_commit()
+            result = await webhook_service.process_webhook_event(
+                webhook_data=test_webhook_data,
+                signature_data=signature_data,
+                correlation_id="test_correlation_id"
+            )
+
+            assert result["duplicate"] is True
+            assert mock_update.call_count == 2
+
     @pytest.mark.asyncio
     async def test_webhook_idempotency_new_event_id(
         self,
@@ -163,16 +211,8 @@ class TestWebhookService:
         """Test webhook processing with new event_id (not duplicate)."""
         webhook_service = WebhookService(mock_db_session)
         
-        # Mock payout with different event_id (not duplicate)
-        test_payout.last_webhook_event_id = "different_event_id"
-        
-        # Mock database query to return None (no duplicate found)
-        mock_result = AsyncMock()
-        mock_result.scalar_one_or_none.return_value = None
-        mock_db_session.execute.return_value = mock_result
-        
-        with patch.object(webhook_service, '_find_payout_by_reference', return_value=test_payout):
-            with patch.object(webhook_service, '_update_payout_from_webhook') as mock_update:
+        with patch.object(webhook_service, '_update_payout_from_webhook', return_value=test_payout.id) as mock_update:
+            with patch.object(webhook_service, '_find_payout_id_by_reference') as mock_find:
                 with patch.object(webhook_service, '_create_webhook_event_record') as mock_record:
                     signature_data = {"type": "hmac_sha256", "verified": True}
                     
@@ -187,8 +227,9 @@ class TestWebhookService:
                     assert result.get("duplicate", False) is False
                     assert "payout_id" in result
                     
-                    # Verify update was called
+                    # Verify update was called and no lookup was needed
                     mock_update.assert_called_once()
+                    mock_find.assert_not_called()
                     mock_record.assert_called_once()
     
     @pytest.mark.asyncio
@@ -201,15 +242,46 @@ class TestWebhookService:
         webhook_service = WebhookService(mock_db_session)
         
         # Mock payout not found
-        with patch.object(webhook_service, '_find_payout_by_reference', return_value=None) as mock_find:
-            signature_data = {"type": "hmac_sha256", "verified": True}
-            
-            result = await webhook_service.process_webhook_event(
-                webhook_data=test_webhook_data,
-                signature_data=signature_data,
-                correlation_id="test_correlation_id"
-            )
-            
-            assert result["processed"] is False
-            assert result["error"] == "Payout not found"
-            assert result["payout_id"] is None
+        with patch.object(webhook_service, '_update_payout_from_webhook', return_value=None):
+            with patch.object(webhook_service, '_find_payout_id_by_reference', return_value=None) as mock_find:
+                signature_data = {"type": "hmac_sha256", "verified": True}
+                
+                result = await webhook_service.process_webhook_event(
+                    webhook_data=test_webhook_data,
+                    signature_data=signature_data,
+                    correlation_id="test_correlation_id"
+                )
+                
+                assert result["processed"] is False
+                assert result["error"] == "Payout not found"
+                assert result["payout_id"] is None
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("provider_status, expected_status", [
+        ("SUCCEEDED", PayoutStatus.succeeded),
+        ("on_hold", None),
+    ])
+    async def test_webhook_update_keeps_raw_provider_status(
+        self,
+        mock_db_session,
+        test_webhook_data: WebhookRequest,
+        provider_status: str,
+        expected_status
+    ):
+        """Test that provider_status is stored verbatim and unknown statuses leave the payout status alone."""
+        webhook_service = WebhookService(mock_db_session)
+        webhook_data = test_webhook_data.model_copy(update={"status": provider_status})
+        mock_db_session.execute.return_value = MagicMock(first=MagicMock(return_value=None))
+        
+        await webhook_service._update_payout_from_webhook(
+            webhook_data=webhook_data,
+            correlation_id="test_correlation_id"
+        )
+        
+        stmt = mock_db_session.execute.call_args.args[0]
+        params = stmt.compile().params
+        assert params["provider_status"] == provider_status
+        if expected_status is None:
+            assert "status" not in params
+        else:
+            assert params["status"] == expected_status
@@ -4,8 +4,11 @@ Implements bounded exponential backoff with jitter to prevent thundering herd pr
 """
 
 import asyncio
+import logging
 import random
 import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 from typing import Any, Callable, Dict, Optional, Type, Union
 from functools import wraps
 
@@ -27,6 +30,7 @@ class RetryConfig:
         max_delay: float = 60.0,
         exponential_base: float = 2.0,
         jitter: bool = True,
+        full_jitter: bool = False,
         retryable_status_codes: set[int] = None,
         retryable_exceptions: tuple[Type[Exception], ...] = None
     ):
@@ -35,6 +39,8 @@ class RetryConfig:
         self.max_delay = max_delay
         self.exponential_base = exponential_base
         self.jitter = jitter
+        # Draw the whole delay from [0, backoff] instead of scaling it by 0.5-1.5
+        self.full_jitter = full_jitter
         self.retryable_status_codes = retryable_status_codes or {429, 500, 502, 503, 504}
         self.retryable_exceptions = retryable_exceptions or (
             httpx.TimeoutException,
@@ -59,13 +65,15 @@ class RetryError(Exception):
         self.attempts = attempts
 
 
-def calculate_delay(attempt: int, config: RetryConfig) -> float:
+def calculate_delay(attempt: int, config: RetryConfig, retry_after: Optional[float] = None) -> float:
     """
     Calculate delay for the given attempt using exponential backoff with jitter.
     
     Args:
         attempt: Current attempt number (0-based)
         config: Retry configuration
+        retry_after: Server-requested wait in seconds, used as a floor for the delay
+            up to config.max_delay
         
     Returns:
         Delay in seconds
@@ -74,13 +82,57 @@ def calculate_delay(attempt: int, config: RetryConfig) -> float:
     
     delay = min(delay, config.max_delay)
     
-    if config.jitter:
+    if config.full_jitter:
+        delay = random.uniform(0, delay)
+    elif config.jitter:
         jitter_factor = random.uniform(0.5, 1.5)
         delay *= jitter_factor
     
+    if retry_after is not None:
+        # A server asking for hours must not park a request for hours
+        delay = max(delay, min(retry_after, config.max_delay))
+    
     return delay
 
 
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Read the Retry-After header from an HTTP error, if present.
+    
+    Args:
+        error: Exception raised by the retried call
+        
+    Returns:
+        Seconds to wait, or None when the error carries no usable Retry-After
+    """
+    if isinstance(error, HTTPException):
+        headers = error.headers
+    elif isinstance(error, httpx.HTTPStatusError):
+        headers = error.response.headers
+    else:
+        return None
+    
+    if not headers:
+        return None
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            # "-0000" dates parse as naive; HTTP dates are always UTC
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
 def is_retryable_error(error: Exception, config: RetryConfig) -> bool:
     """
     Check if an error is retryable based on configuration.
@@ -131,12 +183,13 @@ async def retry_async(
     
     for attempt in range(config.max_retries + 1):
         try:
-            logger.debug("Retry attempt", extra={
-                "correlation_id": correlation_id,
-                "attempt": attempt + 1,
-                "max_retries": config.max_retries,
-                "function": func.__name__
-            })
+            if logger.is_enabled_for(logging.DEBUG):
+                logger.debug("Retry attempt", extra={
+                    "correlation_id": correlation_id,
+                    "attempt": attempt + 1,
+                    "max_retries": config.max_retries,
+                    "function": func.__name__
+                })
             
             result = await func(*args, **kwargs)
             
@@ -162,7 +215,7 @@ async def retry_async(
                 raise e
             
             if attempt < config.max_retries:
-                delay = calculate_delay(attempt, config)
+                delay = calculate_delay(attempt, config, get_retry_after(e))
                 
                 logger.warning("Retryable error encountered, retrying", extra={
                     "correlation_id": correlation_id,
@@ -221,12 +274,13 @@ def retry_sync(
     
     for attempt in range(config.max_retries + 1):
         try:
-            logger.debug("Retry attempt", extra={
-                "correlation_id": correlation_id,
-                "attempt": attempt + 1,
-                "max_retries": config.max_retries,
-                "function": func.__name__
-            })
+            if logger.is_enabled_for(logging.DEBUG):
+                logger.debug("Retry attempt", extra={
+                    "correlation_id": correlation_id,
+                    "attempt": attempt + 1,
+                    "max_retries": config.max_retries,
+                    "function": func.__name__
+                })
             
             result = func(*args, **kwargs)
             
@@ -252,7 +306,7 @@ def retry_sync(
                 raise e
             
             if attempt < config.max_retries:
-                delay = calculate_delay(attempt, config)
+                delay = calculate_delay(attempt, config, get_retry_after(e))
                 
                 logger.warning("Retryable error encountered, retrying", extra={
                     "correlation_id": correlation_id,
@@ -318,6 +372,7 @@ PAYMENT_API_RETRY_CONFIG = RetryConfig(
     max_delay=30.0,
     exponential_base=2.0,
     jitter=True,
+    full_jitter=True,
     retryable_status_codes={429, 500, 502, 503, 504, 408}
 )
 